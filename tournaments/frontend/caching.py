@@ -0,0 +1,25 @@
+from django.db.models import Count, Max, Sum
+
+from tournaments import models
+
+
+async def get_index_cache_key():
+    """
+    Return the key, under which the index for anonymous users is cached.
+
+    The key is derived from the database (by a single aggregate query), so that all workers agree on it, and a change
+    made by any worker is seen by all the others. The revisions of the tournaments are incremented whenever a tournament
+    is edited or progresses, and the participations are reflected by their count, and by the largest id and the sum of
+    the slots (which change when participations are added or re-ordered). Since the revisions only ever increase, so does
+    their sum, even though it is taken over the participations (each revision counted once for each participation).
+    Changes which are not reflected (e.g., renaming a participant in the admin) are seen once the cached index expires.
+    """
+    fingerprint = await models.Tournament.objects.aaggregate(
+        tournaments_count = Count('id', distinct = True),
+        max_tournament_id = Max('id'),
+        revisions = Sum('revision'),
+        participations_count = Count('participations'),
+        max_participation_id = Max('participations__id'),
+        slots = Sum('participations__slot_id'),
+    )
+    return 'index:' + ':'.join(str(value) for value in fingerprint.values())
@@ -0,0 +1,61 @@
+import asyncio
+import contextlib
+import threading
+
+
+class EventHub:
+    """
+    In-process broadcast hub for the events of tournaments (e.g., score submissions, confirmations, stage advances).
+
+    Subscribers are asynchronous (e.g., server-sent event streams), and each receives the events of a tournament through
+    its own bounded queue. Events can be published from any thread (e.g., from synchronous views). The queue of a
+    subscriber who does not keep up is not blocked on, instead the events are dropped for that subscriber.
+    """
+
+    def __init__(self, max_queue_size = 100):
+        self.max_queue_size = max_queue_size
+        self.subscriptions = dict() ## maps tournament IDs to sets of (event loop, queue) pairs
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def subscribe(self, tournament_id):
+        """
+        Subscribe to the events of a tournament, from within a running event loop. Yields the queue of the events.
+        """
+        subscription = (asyncio.get_running_loop(), asyncio.Queue(maxsize = self.max_queue_size))
+        with self.lock:
+            self.subscriptions.setdefault(tournament_id, set()).add(subscription)
+        try:
+            yield subscription[1]
+        finally:
+            with self.lock:
+                subscriptions = self.subscriptions.get(tournament_id, set())
+                subscriptions.discard(subscription)
+                if len(subscriptions) == 0:
+                    self.subscriptions.pop(tournament_id, None)
+
+    def publish(self, tournament_id, event):
+        """
+        Publish an `event` (a JSON-serializable dictionary) to all subscribers of a tournament.
+        """
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(tournament_id, set()))
+        for loop, queue in subscriptions:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, event)
+            except RuntimeError:
+                pass ## the event loop of the subscriber is already closed
+
+    def subscribers_count(self, tournament_id):
+        with self.lock:
+            return len(self.subscriptions.get(tournament_id, set()))
+
+    @staticmethod
+    def _put(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass ## the subscriber does not keep up
+
+
+hub = EventHub()
@@ -1,10 +1,8 @@
 import re
 
-import yaml
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.core.exceptions import ValidationError
-from django.db import transaction
 
 from tournaments import models
 
@@ -21,46 +19,32 @@ class SignupForm(UserCreationForm):
 class CreateTournamentForm(forms.Form):
 
     name = forms.CharField(label = 'Name', max_length = 100, required = True)
-    definition = forms.CharField(label = 'Definition', widget = forms.Textarea(attrs = {'class': 'textarea-monospace'}), required = True)
+    definition = forms.CharField(label = 'Definition', widget = forms.Textarea(attrs = {'class': 'textarea-monospace'}), required = True, strip = False) ## not stripped, so that the definition is stored verbatim
 
-    @transaction.atomic
-    def validate_definition(self, definition):
+    def validate_definition(self, definition_str):
         try:
-            tournament = models.Tournament.load(definition = definition, name = 'Test')
-            tournament.full_clean()
-            for stage in tournament.stages.all():
-                stage.full_clean()
+            models.compile_definition(definition_str).validate()
         except ValidationError as error:
             raise ValidationError(' '.join((str(err) for err in error.messages))) from error
         except KeyError as error:
             raise ValidationError(f'Missing key: "{error.args[0]}".') from error
         except Exception as error:
             raise ValidationError(error) from error
-        transaction.set_rollback(True)
 
     def clean_definition(self):
         definition_str = self.cleaned_data['definition']
 
-        # Check for syntactic correctness.
-        try:
-            definition = yaml.safe_load(definition_str)
-            assert isinstance(definition, dict)
-        except (yaml.YAMLError, AssertionError) as error:
-            raise ValidationError('Definition must be supplied in valid YAML.') from error
-
-        # Check for semantic correctness.
-        self.validate_definition(definition)
+        # Check for syntactic and semantic correctness (the compiled definition is cached, so that it is neither parsed
+        # nor validated again when the tournament is created).
+        self.validate_definition(definition_str)
 
-        return definition
+        return definition_str
 
     def create_tournament(self, request):
-        tournament = models.Tournament.load(
+        return models.Tournament.load(
             definition = self.cleaned_data['definition'],
             name = self.cleaned_data['name'],
             creator = request.user)
-        tournament.definition = self.data['definition']
-        tournament.save()
-        return tournament
 
 
 class UpdateTournamentForm(CreateTournamentForm):
@@ -1,20 +1,96 @@
-import os
+import functools
+import json
 import pathlib
 import re
 import subprocess
 
+backend_path = pathlib.Path(__file__).parents[1]
+version_file_path = pathlib.Path(__file__).parent / 'version.json'
 
-def get_head_info():
-    backend_path = pathlib.Path(__file__).parents[1]
-    os.chdir(backend_path)
 
-    result = subprocess.run(['git', 'rev-parse', 'HEAD'], stdout=subprocess.PIPE)
-    sha = result.stdout.decode('utf-8').strip()
+def get_head_info():
+    """
+    Query the SHA and the commit date of the HEAD revision by spawning `git`. Returns `None` if that fails (e.g., if
+    `git` is not installed, or the backend is not deployed within a repository).
+    """
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd = backend_path, stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, check = True)
+        sha = result.stdout.decode('utf-8').strip()
 
-    result = subprocess.run(['git', 'show', '--no-patch', '--format="%cd"', '--date=short', sha], stdout=subprocess.PIPE)
-    date = result.stdout.decode('utf-8').strip()
+        result = subprocess.run(['git', 'show', '--no-patch', '--format="%cd"', '--date=short', sha], cwd = backend_path, stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, check = True)
+        date = result.stdout.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
 
     m = re.match(r'^"(.+)"$', date)
+    if m is None:
+        return None
     date = m.group(1)
 
     return dict(sha = sha, date = date)
+
+
+def write_version_file(path = None):
+    """
+    Resolve the version info of the HEAD revision and write it to the version file (or `path`), so that it can be read
+    at runtime without spawning any processes. Returns the version info (`None` if it could not be resolved, and no file
+    is written in that case).
+    """
+    version = get_head_info()
+    if version is not None:
+        with open(path or version_file_path, 'w') as fp:
+            json.dump(version, fp)
+    return version
+
+
+def read_head_sha():
+    """
+    Read the SHA of the HEAD revision directly from the `.git` directory, without spawning any processes. Returns `None`
+    if there is no `.git` directory, or the HEAD cannot be resolved.
+    """
+    for path in (backend_path, *backend_path.parents):
+        git_path = path / '.git'
+        if git_path.is_dir():
+            break
+    else:
+        return None
+
+    try:
+        head = (git_path / 'HEAD').read_text().strip()
+        if not head.startswith('ref: '):
+            return head ## detached HEAD
+        ref = head[len('ref: '):]
+        ref_path = git_path / ref
+        if ref_path.is_file():
+            return ref_path.read_text().strip()
+
+        # The reference might have been packed.
+        packed_refs_path = git_path / 'packed-refs'
+        if packed_refs_path.is_file():
+            for line in packed_refs_path.read_text().splitlines():
+                if line.endswith(f' {ref}'):
+                    return line.split(' ')[0]
+    except OSError:
+        pass
+    return None
+
+
+@functools.lru_cache(maxsize = None)
+def get_version_info():
+    """
+    Get the version info, resolved lazily on first use and then cached for the lifetime of the process.
+
+    The version file written at build time (by the `collectstatic` or `writeversion` commands) is read if it exists.
+    Otherwise, the SHA is read from the `.git` directory (without a date). Returns `None` if neither is available.
+    """
+    try:
+        with open(version_file_path) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        pass
+
+    sha = read_head_sha()
+    if sha is None:
+        return None
+    else:
+        return dict(sha = sha, date = '')
@@ -0,0 +1,15 @@
+from django.contrib.staticfiles.management.commands import collectstatic
+
+from frontend.git import write_version_file
+
+
+class Command(collectstatic.Command):
+    """
+    Collect the static files, and also resolve the version info at build time.
+    """
+
+    def handle(self, **options):
+        result = super().handle(**options)
+        if write_version_file() is None:
+            self.stderr.write('Failed to resolve the version info (git is not available).')
+        return result
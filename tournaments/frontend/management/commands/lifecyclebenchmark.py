@@ -0,0 +1,179 @@
+import contextlib
+import json
+import platform
+import time
+import tracemalloc
+
+import django
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from frontend.git import get_version_info
+from tournaments import models
+
+scenarios = {
+    'groups':
+        """
+        stages:
+        - id: groups
+          mode: groups
+          min-group-size: 3
+          max-group-size: 4
+        podium:
+        - groups.placements[0]
+        """,
+    'division':
+        """
+        stages:
+        - id: division
+          mode: division
+        podium:
+        - division.placements[0]
+        - division.placements[1]
+        - division.placements[2]
+        """,
+    'knockout':
+        """
+        stages:
+        - id: knockout
+          mode: knockout
+        podium:
+        - knockout.placements[0]
+        - knockout.placements[1]
+        - knockout.placements[2]
+        """,
+    'double-elimination':
+        """
+        stages:
+        - id: knockout
+          mode: knockout
+          double-elimination: true
+        podium:
+        - knockout.placements[0]
+        - knockout.placements[1]
+        - knockout.placements[2]
+        """,
+    'multi-stage':
+        """
+        stages:
+        - id: preliminaries
+          mode: groups
+          min-group-size: 3
+          max-group-size: 4
+        - id: main_round
+          mode: knockout
+          played-by:
+          - preliminaries.placements[0]
+          - preliminaries.placements[1]
+        - id: playoffs
+          mode: division
+          played-by:
+          - main_round.placements[2]
+          - main_round.placements[3]
+        podium:
+        - main_round.placements[0]
+        - main_round.placements[1]
+        - playoffs.placements[0]
+        """,
+}
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Play synthetic tournaments of increasing size to completion, and report the wall time, the number of queries, '
+        'and the peak memory of each phase (load, start, confirm, render) as JSON, so that reports of different revisions '
+        'can be compared. All changes to the database are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', nargs = '+', choices = list(scenarios.keys()), default = list(scenarios.keys()), help = 'Tournament definitions to play (default: all).')
+        parser.add_argument('--sizes', nargs = '+', type = int, default = [8, 16, 32], help = 'Numbers of participants.')
+        parser.add_argument('--seed', type = int, default = 0, help = 'Seed of the draws.')
+        parser.add_argument('--host', default = 'localhost', help = 'Host header of the render requests (must be allowed).')
+        parser.add_argument('--output', default = '-', help = 'Path of the JSON report (default: standard output).')
+
+    def handle(self, *args, **options):
+        report = dict(
+            version = get_version_info(),
+            python = platform.python_version(),
+            django = django.get_version(),
+            database = connection.vendor,
+            results = list(),
+        )
+        for scenario in options['scenarios']:
+            for size in options['sizes']:
+                phases = self.benchmark(scenarios[scenario], size, options['seed'], options['host'])
+                report['results'].append(dict(scenario = scenario, participants = size, phases = phases))
+                if options['output'] != '-':
+                    self.stdout.write(f'{scenario} ({size} participants): ' + ', '.join(f'{phase} {result["time"]:.3f}s' for phase, result in phases.items()))
+
+        report_str = json.dumps(report, indent = 2)
+        if options['output'] == '-':
+            self.stdout.write(report_str)
+        else:
+            with open(options['output'], 'w') as fp:
+                fp.write(report_str + '\n')
+
+    def benchmark(self, definition, size, seed, host):
+        """
+        Play a tournament with `size` participants to completion, and return the measurements of each phase.
+        """
+        phases = dict()
+        with transaction.atomic():
+            with self.measure(phases, 'load'):
+                tournament = models.Tournament.load(definition = definition, name = 'Benchmark', published = True)
+                users = models.User.objects.bulk_create([models.User(username = f'--benchmark-{pidx}') for pidx in range(size)])
+                tournament.update_participants([user.username for user in users])
+
+            with self.measure(phases, 'start'):
+                tournament.test()
+                tournament.shuffle_participants(seed = seed)
+                tournament.update_state()
+
+            # Play through the tournament, always make the participant with the higher ID win.
+            with self.measure(phases, 'confirm'):
+                users = list(tournament.participating_users)
+                while tournament.current_stage is not None:
+                    for fixture in tournament.current_stage.current_fixtures:
+                        fixture.score = (fixture.player1.id, fixture.player2.id)
+                        fixture.save()
+                        fixture.confirmations.add(*users[:fixture.required_confirmations_count])
+                    tournament.update_state()
+            if tournament.state != 'finished':
+                raise CommandError(f'The tournament is not finished ({tournament.state}).')
+
+            # The tournaments of the scenarios are rolled back, so their IDs are reused, and the cached renderings of an
+            # earlier scenario would be served (keyed by the ID and the revision).
+            caches['fragments'].clear()
+            with self.measure(phases, 'render'):
+                response = Client(HTTP_HOST = host).get(reverse('tournament-progress', kwargs = dict(pk = tournament.id)))
+            if response.status_code != 200:
+                raise CommandError(f'Rendering the progress failed (status {response.status_code}).')
+
+            transaction.set_rollback(True)
+        return phases
+
+    @contextlib.contextmanager
+    def measure(self, phases, phase):
+        """
+        Measure the wall time, the number of queries, and the peak memory (as traced by `tracemalloc`, which slows down
+        the execution, but does so alike for all revisions) of the enclosed code.
+        """
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        memory0 = tracemalloc.get_traced_memory()[0]
+        with CaptureQueriesContext(connection) as queries:
+            t0 = time.perf_counter()
+            yield
+            t1 = time.perf_counter()
+        peak_memory = tracemalloc.get_traced_memory()[1] - memory0
+        if not tracing:
+            tracemalloc.stop()
+        phases[phase] = dict(time = round(t1 - t0, 6), queries = len(queries), peak_memory = peak_memory)
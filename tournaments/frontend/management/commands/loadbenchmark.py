@@ -0,0 +1,61 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client
+
+
+class Command(BaseCommand):
+
+    help = 'Compare the throughput of pages served through the WSGI and the ASGI request handlers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs = '*', default = ['/'], help = 'Paths of the pages to request (default: the index).')
+        parser.add_argument('--requests', type = int, default = 200, help = 'Number of requests per path and handler.')
+        parser.add_argument('--concurrency', type = int, default = 10, help = 'Number of concurrent requests.')
+        parser.add_argument('--host', default = 'localhost', help = 'Host header of the requests (must be allowed).')
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            wsgi_throughput = self.benchmark_wsgi(path, options['requests'], options['concurrency'], options['host'])
+            asgi_throughput = async_to_sync(self.benchmark_asgi)(path, options['requests'], options['concurrency'], options['host'])
+            self.stdout.write(f'{path}: WSGI {wsgi_throughput:.1f} requests/s, ASGI {asgi_throughput:.1f} requests/s')
+
+    def benchmark_wsgi(self, path, requests, concurrency, host):
+        """
+        Serve the requests through the WSGI handler, by a pool of `concurrency` worker threads.
+        """
+        def request(_):
+            try:
+                return Client(HTTP_HOST = host).get(path).status_code
+            finally:
+                connections.close_all()
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers = concurrency) as executor:
+            status_codes = list(executor.map(request, range(requests)))
+        self.check_status_codes(path, status_codes)
+        return requests / (time.perf_counter() - t0)
+
+    async def benchmark_asgi(self, path, requests, concurrency, host):
+        """
+        Serve the requests through the ASGI handler, by `concurrency` concurrent tasks within a single event loop.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request():
+            async with semaphore:
+                return (await AsyncClient(HTTP_HOST = host).get(path)).status_code
+
+        t0 = time.perf_counter()
+        status_codes = await asyncio.gather(*(request() for _ in range(requests)))
+        self.check_status_codes(path, status_codes)
+        return requests / (time.perf_counter() - t0)
+
+    def check_status_codes(self, path, status_codes):
+        failed = [status_code for status_code in status_codes if status_code != 200]
+        if len(failed) > 0:
+            raise CommandError(f'{len(failed)} requests of {path} failed (status {failed[0]}).')
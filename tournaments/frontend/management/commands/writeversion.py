@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from frontend import git
+
+
+class Command(BaseCommand):
+
+    help = 'Resolve the version info of the HEAD revision and write it to the version file read at runtime.'
+
+    def handle(self, *args, **options):
+        version = git.write_version_file()
+        if version is None:
+            raise CommandError('Failed to resolve the version info (git is not available).')
+        self.stdout.write(f'Version {version["sha"][:7]} {version["date"]} written to {git.version_file_path}')
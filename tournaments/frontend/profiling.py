@@ -0,0 +1,206 @@
+import collections
+import contextvars
+import pathlib
+import random
+import sys
+import threading
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+project_path = str(pathlib.Path(__file__).parents[1])
+
+
+class ProfileStore:
+    """
+    In-process store of the most recent SQL profiles (each worker process keeps its own).
+    """
+
+    def __init__(self, max_size = 100):
+        self.profiles = collections.OrderedDict() ## maps profile IDs to profiles, oldest first
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+    def add(self, profile):
+        with self.lock:
+            self.profiles[profile['id']] = profile
+            while len(self.profiles) > self.max_size:
+                self.profiles.popitem(last = False)
+
+    def get(self, profile_id):
+        with self.lock:
+            return self.profiles.get(profile_id)
+
+    def list(self):
+        """
+        Return the stored profiles, most recent first.
+        """
+        with self.lock:
+            return list(reversed(self.profiles.values()))
+
+    def clear(self):
+        with self.lock:
+            self.profiles.clear()
+
+
+store = ProfileStore()
+
+
+def get_caller_name():
+    """
+    Return the qualified name of the innermost function of the project in the current call stack (e.g.,
+    `tournaments.models.Knockout.current_level`), which is the function that the current query is attributed to.
+
+    Note that queries of the async ORM run in a worker thread, whose stack does not include the awaiting coroutines.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(project_path) and filename != __file__:
+            name = frame.f_code.co_name
+            self = frame.f_locals.get('self')
+            if self is not None and hasattr(type(self), name):
+                name = f'{type(self).__name__}.{name}'
+            return f'{frame.f_globals.get("__name__")}.{name}'
+        frame = frame.f_back
+    return None ## the query was not issued by the project (e.g., by the session middleware)
+
+
+class Profile:
+    """
+    Records the queries of a request, along with the functions that they are attributed to.
+    """
+
+    def __init__(self):
+        self.queries = list() ## list of (SQL, duration, caller name) triplets
+
+    def __call__(self, execute, sql, params, many, context):
+        caller_name = get_caller_name()
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - t0, caller_name))
+
+    def summarize(self, request, response):
+        """
+        Summarize the queries by the functions that they are attributed to. Queries are considered duplicates if their SQL
+        (without the parameters) was already issued before, which indicates N+1 query patterns.
+        """
+        groups = dict()
+        repeated = dict()
+        for sql, duration, caller_name in self.queries:
+            group = groups.setdefault(caller_name, dict(name = caller_name, queries = 0, time = 0., duplicates = 0))
+            group['queries'] += 1
+            group['time'] += duration
+            if sql in repeated:
+                group['duplicates'] += 1
+                repeated[sql]['count'] += 1
+                if caller_name not in repeated[sql]['groups']:
+                    repeated[sql]['groups'].append(caller_name)
+            else:
+                repeated[sql] = dict(sql = sql, count = 1, groups = [caller_name])
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        return dict(
+            id = uuid.uuid4().hex,
+            method = request.method,
+            path = request.path,
+            view = resolver_match.view_name if resolver_match else None,
+            status = response.status_code,
+            queries = len(self.queries),
+            time = sum(duration for _, duration, _ in self.queries),
+            duplicates = sum(group['duplicates'] for group in groups.values()),
+            groups = sorted(groups.values(), key = lambda group: group['time'], reverse = True),
+            repeated = sorted((entry for entry in repeated.values() if entry['count'] > 1), key = lambda entry: entry['count'], reverse = True),
+        )
+
+
+current_profile = contextvars.ContextVar('current_profile', default = None) ## the profile of the current request
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Record the query in the profile of the current request, if the request is profiled.
+
+    This is installed permanently on the connections, so that the queries of concurrent requests, which may share a
+    connection (e.g., the async ORM and the synchronous code of ASGI requests), are recorded by the context of each request.
+    """
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile(execute, sql, params, many, context)
+
+
+def install(connection = None, **kwargs):
+    """
+    Install `record_query` on the `connection`, or on all connections of the current thread.
+    """
+    for _connection in (connections.all() if connection is None else [connection]):
+        if record_query not in _connection.execute_wrappers:
+            _connection.execute_wrappers.append(record_query)
+
+
+class SQLProfilingMiddleware:
+    """
+    Records the queries of a sample of the requests, and attributes them to the functions of the project that issue
+    them (e.g., model properties and view methods).
+
+    The middleware is opt-in, by setting `SQL_PROFILING_SAMPLE_RATE` to the fraction of the requests to be profiled
+    (e.g., `0.01` in production). The summary of a profiled request is sent in the `X-SQL-Profile` header, and the full
+    profile is kept in the store, from which it can be retrieved by staff users via the `sql-profiles` endpoint. The
+    middleware supports both sync and async requests, so that it does not force async views into a thread.
+    """
+
+    sync_capable  = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'SQL_PROFILING_SAMPLE_RATE', 0)
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed()
+        store.max_size = getattr(settings, 'SQL_PROFILING_HISTORY_SIZE', store.max_size)
+        connection_created.connect(install, dispatch_uid = 'sql-profiling')
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = Profile()
+        install()
+        token = current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        # The connections are local to the thread, which runs the synchronous code (and the async ORM) of the request.
+        profile = Profile()
+        await sync_to_async(install)()
+        token = current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.finish(request, response, profile)
+
+    def finish(self, request, response, profile):
+        summary = profile.summarize(request, response)
+        store.add(summary)
+        response['X-SQL-Profile'] = f'id={summary["id"]}; queries={summary["queries"]}; duplicates={summary["duplicates"]}; time={summary["time"]:.6f}'
+        return response
@@ -29,13 +29,13 @@ def position_to_str(pos):
 @register.filter
 def parse_participants(participants_str_list, tournament):
     participants = list()
+    stages = {stage.identifier: (stage_position, stage) for stage_position, stage in enumerate(tournament.stages.non_polymorphic())}
     for identifier, position in parse_participants_str_list(participants_str_list):
-        stage = tournament.stages.get(identifier = identifier)
+        stage_position, stage = stages[identifier]
         which = position_to_str(position + 1)
         if stage.name:
             stage_name = stage.name
         else:
-            stage_position = [stage.id for stage in tournament.stages.all()].index(stage.id)
             stage_name = f'Tournament Stage {stage_position + 1}'
         participants.append(f'{which} of {stage_name}')
     return participants
@@ -1,13 +1,26 @@
+import asyncio
+import io
+import json
+import pathlib
 import re
+import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
 from django.contrib.auth.views import LoginView
-from django.test import TestCase
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from tournaments import models
 from tournaments.tests import _confirm_fixture, test_tournament1_yml
 
-from . import views
+from . import caching, events, forms, git, profiling, views
 
 password1 = 'Xz23#!sZ'
 
@@ -20,6 +33,9 @@ def strip_yaml_indent(yaml):
 
 class IndexViewTests(TestCase):
 
+    def setUp(self):
+        caches['fragments'].clear()
+
     def test_empty(self):
         response = self.client.get(reverse('index'))
         self.assertEqual(response.status_code, 200)
@@ -69,6 +85,160 @@ class IndexViewTests(TestCase):
         self.assertContains(response, 'Edit')
 
 
+    def test_allstars(self):
+        participants = [models.Participant.objects.create(name = f'Participant{idx}') for idx in range(3)]
+        for tidx, podium in enumerate([(0, 1, 2), (0, 2, 1)]):
+            tournament = models.Tournament.load(definition = test_tournament1_yml, name = f'Test{tidx}')
+            for position, pidx in enumerate(podium):
+                models.Participation.objects.create(tournament = tournament, participant = participants[pidx], slot_id = position, podium_position = position)
+        models.AllStarsRow.rebuild(participant.id for participant in participants)
+
+        with self.assertNumQueries(3):
+            allstars = async_to_sync(views.IndexView().get_allstars)()
+        self.assertEqual([[(result['participant'].name, result['count']) for result in results] for results in allstars], [
+            [('Participant0', 2)],
+            [('Participant1', 1), ('Participant2', 1)],
+            [('Participant1', 1), ('Participant2', 1)],
+        ])
+
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'All Stars')
+        self.assertContains(response, '&starf;&starf;')
+
+    def test_allstars_all(self):
+        participants = [models.Participant.objects.create(name = f'Participant{idx:02d}') for idx in range(12)]
+        for pidx, participant in enumerate(participants):
+            tournament = models.Tournament.load(definition = test_tournament1_yml, name = f'Test{pidx}')
+            models.Participation.objects.create(tournament = tournament, participant = participant, slot_id = 0, podium_position = 0)
+        models.AllStarsRow.rebuild(participant.id for participant in participants)
+
+        # All participants with placements are listed.
+        allstars = async_to_sync(views.IndexView().get_allstars)()
+        self.assertEqual([result['participant'].name for result in allstars[0]], [participant.name for participant in participants])
+
+
+class IndexCacheTests(TestCase):
+
+    def setUp(self):
+        caches['fragments'].clear()
+
+    def test_anonymous(self):
+        tournament = models.Tournament.load(definition = test_tournament1_yml, name = 'Test', published = True)
+        response1 = self.client.get(reverse('index'))
+        self.assertContains(response1, 'Open')
+
+        # The index is served from the cache, by a single query for the cache key.
+        with self.assertNumQueries(1):
+            response2 = self.client.get(reverse('index'))
+        self.assertEqual(response1.content, response2.content)
+
+        # The cache is invalidated when the state of a tournament changes.
+        add_participants(tournament, num_users = 10)
+        tournament.update_state()
+        response3 = self.client.get(reverse('index'))
+        self.assertContains(response3, 'Active')
+        self.assertNotContains(response3, 'Open')
+
+    def test_invalidation(self):
+        tournament = models.Tournament.load(definition = test_tournament1_yml, name = 'Test', published = True)
+        cache_keys = [async_to_sync(caching.get_index_cache_key)()]
+
+        # The cache key changes with the participations (even by bulk updates), and when a tournament is edited.
+        tournament.update_participants(['participant1', 'participant2'])
+        cache_keys.append(async_to_sync(caching.get_index_cache_key)())
+        tournament.update_participants(['participant2', 'participant1'])
+        cache_keys.append(async_to_sync(caching.get_index_cache_key)())
+        tournament.update_participants(['participant2'])
+        cache_keys.append(async_to_sync(caching.get_index_cache_key)())
+        tournament.name = 'Test 2'
+        tournament.save()
+        cache_keys.append(async_to_sync(caching.get_index_cache_key)())
+        self.assertEqual(len(set(cache_keys)), len(cache_keys))
+
+        # The cache key is not changed by reading.
+        self.client.get(reverse('index'))
+        self.assertEqual(async_to_sync(caching.get_index_cache_key)(), cache_keys[-1])
+
+
+class LoadBenchmarkCommandTests(TransactionTestCase):
+
+    def test(self):
+        out = io.StringIO()
+        call_command('loadbenchmark', '/', requests = 4, concurrency = 2, host = 'testserver', stdout = out)
+        self.assertRegex(out.getvalue(), r'^/: WSGI [0-9.]+ requests/s, ASGI [0-9.]+ requests/s$')
+
+
+class LifecycleBenchmarkCommandTests(TestCase):
+
+    def test(self):
+        out = io.StringIO()
+        call_command('lifecyclebenchmark', sizes = [8], host = 'testserver', stdout = out)
+        report = json.loads(out.getvalue())
+        self.assertEqual([(result['scenario'], result['participants']) for result in report['results']], [
+            ('groups', 8),
+            ('division', 8),
+            ('knockout', 8),
+            ('double-elimination', 8),
+            ('multi-stage', 8),
+        ])
+        for result in report['results']:
+            self.assertEqual(list(result['phases'].keys()), ['load', 'start', 'confirm', 'render'])
+            for phase in result['phases'].values():
+                self.assertGreater(phase['queries'], 0)
+                self.assertGreater(phase['peak_memory'], 0)
+
+        # All changes to the database are rolled back.
+        self.assertFalse(models.Tournament.objects.exists())
+        self.assertFalse(models.User.objects.exists())
+
+
+class VersionInfoTests(SimpleTestCase):
+
+    def setUp(self):
+        git.get_version_info.cache_clear()
+        self.addCleanup(git.get_version_info.cache_clear)
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.version_file_path = pathlib.Path(tempdir.name) / 'version.json'
+        patcher = mock.patch.object(git, 'version_file_path', self.version_file_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_write_version_file(self):
+        version = git.write_version_file(self.version_file_path)
+        self.assertEqual(len(version['sha']), 40)
+        self.assertRegex(version['date'], r'^[0-9]{4}-[0-9]{2}-[0-9]{2}$')
+        with open(self.version_file_path) as fp:
+            self.assertEqual(json.load(fp), version)
+
+    def test_get_version_info(self):
+        with open(self.version_file_path, 'w') as fp:
+            json.dump(dict(sha = 'a' * 40, date = '2025-01-01'), fp)
+        with mock.patch('subprocess.run') as run:
+            self.assertEqual(git.get_version_info(), dict(sha = 'a' * 40, date = '2025-01-01'))
+            run.assert_not_called()
+
+    def test_get_version_info_fallback(self):
+        with mock.patch('subprocess.run') as run:
+            version = git.get_version_info()
+            run.assert_not_called()
+        self.assertEqual(version['sha'], git.get_head_info()['sha'])
+        self.assertEqual(version['date'], '')
+
+    def test_collectstatic(self):
+        with tempfile.TemporaryDirectory() as static_root, self.settings(STATIC_ROOT = static_root):
+            call_command('collectstatic', interactive = False, verbosity = 0)
+        with open(self.version_file_path) as fp:
+            self.assertEqual(json.load(fp), git.get_head_info())
+
+    def test_writeversion(self):
+        out = io.StringIO()
+        call_command('writeversion', stdout = out)
+        self.assertRegex(out.getvalue(), r'^Version [0-9a-f]{7} [0-9-]+ written to ')
+        with open(self.version_file_path) as fp:
+            self.assertEqual(json.load(fp), git.get_head_info())
+
+
 class SignupViewTests(TestCase):
 
     def test_form(self):
@@ -196,6 +366,15 @@ class CreateTournamentViewTests(TestCase):
         self.assertContains(response, 'Preview')
         self.assertContains(response, 'Definition must be supplied in valid YAML.')
 
+    def test_post_invalid_definition(self):
+        definition = strip_yaml_indent(test_tournament1_yml).replace('- main_round.placements[0]', '- finals.placements[0]')
+        form = forms.CreateTournamentForm(dict(name = 'Test', definition = definition))
+
+        # Verify that the definition is validated without any database queries.
+        with self.assertNumQueries(0):
+            self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['definition'], ['Error parsing "podium" definition (stage "finals" does not exist).'])
+
 
 class UpdateTournamentViewTests(TestCase):
 
@@ -334,11 +513,11 @@ def add_participants(tournament, num_users = 10, names = None):
     users = [models.User.objects.get_or_create(username = f'user{idx}')[0] for idx in range(num_users)]
     for user in users:
         participant = models.Participant.get_or_create_for_user(user)
-        models.Participation.objects.create(tournament = tournament, participant = participant, slot_id = models.Participation.next_slot_id(tournament))
+        models.Participation.create_in_next_slot(tournament, participant)
 
     for name in names:
         participant = models.Participant.objects.get_or_create(name = name)[0]
-        models.Participation.objects.create(tournament = tournament, participant = participant, slot_id = models.Participation.next_slot_id(tournament))
+        models.Participation.create_in_next_slot(tournament, participant)
         
     return users
 
@@ -498,6 +677,57 @@ class JoinTournamentViewTests(TestCase):
         self.assertTrue(self.user1 in self.user1_tournament.participating_users)
 
 
+class JoinTournamentViewConcurrencyTests(TransactionTestCase):
+    """
+    The joins are made by concurrent connections, which the in-memory test database serves differently from production
+    (its connections share a cache, and fail on locked tables instead of waiting), thus the tests are run on a copy of
+    the test database in a file.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        tempdir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(tempdir.cleanup)
+
+        # Copy the test database into a file, and keep the in-memory database open (it is destroyed otherwise).
+        connection.ensure_connection()
+        memory_connection = connection.connection
+        file_connection = sqlite3.connect(pathlib.Path(tempdir.name) / 'db.sqlite3')
+        memory_connection.backup(file_connection)
+        file_connection.close()
+
+        # Let all connections (including those of other threads) connect to the file.
+        memory_name = connection.settings_dict['NAME']
+        connection.connection = None
+        connection.settings_dict['NAME'] = pathlib.Path(tempdir.name) / 'db.sqlite3'
+
+        def restore():
+            connection.close()
+            connection.settings_dict['NAME'] = memory_name
+            connection.ensure_connection()
+            memory_connection.close()
+        cls.addClassCleanup(restore)
+
+    def test(self):
+        tournament = models.Tournament.load(definition = test_tournament1_yml, name = 'Test1', published = True)
+        users = [models.User.objects.create(username = f'user{idx}') for idx in range(20)]
+
+        def join(user):
+            try:
+                client = Client()
+                client.force_login(user)
+                return client.get(reverse('join-tournament', kwargs = dict(pk = tournament.id))).status_code
+            finally:
+                connections.close_all()
+
+        # Each join must get a distinct slot, even if the joins are simultaneous.
+        with ThreadPoolExecutor(max_workers = len(users)) as executor:
+            status_codes = list(executor.map(join, users))
+        self.assertEqual(status_codes, [302] * len(users))
+        self.assertEqual(sorted(tournament.participations.values_list('slot_id', flat = True)), list(range(len(users))))
+
+
 class WithdrawTournamentViewTests(TestCase):
 
     def setUp(self):
@@ -510,7 +740,7 @@ class WithdrawTournamentViewTests(TestCase):
 
         for tournament in models.Participation.objects.all():
             for user in models.User.objects.all():
-                models.Participation.objects.create(tournament = tournament, participant = models.Participant.create_for_user(user), slot_id = models.Participation.next_slot_id(tournament))
+                models.Participation.create_in_next_slot(tournament, models.Participant.create_for_user(user))
 
     def test_unauthenticated(self):
         self.client.logout()
@@ -618,6 +848,7 @@ class TournamentProgressViewTests(TestCase):
         self.tournament2 = models.Tournament.load(definition = test_tournament1_yml, name = 'Test2', creator = self.user2, published = True)
 
         self.users = add_participants(self.tournament1, num_users = 10)
+        caches['fragments'].clear()
 
     def test_unauthenticated_open(self):
         """
@@ -643,6 +874,32 @@ class TournamentProgressViewTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, '<h2>Preliminaries <small class="text-muted">Current Stage</small></h2>')
 
+    def test_num_queries(self):
+        """
+        The number of queries for rendering the progress does not depend on the number of participants and fixtures.
+        """
+        num_queries = list()
+        for num_users in (10, 24):
+            tournament = models.Tournament.load(definition = test_tournament1_yml, name = f'Test{num_users}', creator = self.user1, published = True)
+            users = start_tournament(tournament, num_users = num_users)
+            self.client.force_login(users[0])
+
+            # Play the preliminaries, so that the main round (knockout) is the current stage.
+            stage = tournament.current_stage
+            for fixture in stage.fixtures.all():
+                _confirm_fixture(users, fixture)
+                tournament.handle_confirmed_fixture(stage, fixture)
+            self.assertEqual(tournament.current_stage.identifier, 'main_round')
+
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('tournament-progress', kwargs = dict(pk = tournament.id)))
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, '<h2>Main Round <small class="text-muted">Current Stage</small></h2>')
+            num_queries.append(len(queries))
+
+        self.assertEqual(num_queries[0], num_queries[1])
+        self.assertLessEqual(num_queries[1], 30)
+
     def test_not_found(self):
         response = self.client.get(reverse('tournament-progress', kwargs = dict(pk = 0)))
         self.assertEqual(response.status_code, 404)
@@ -690,6 +947,7 @@ class TournamentProgressViewTests(TestCase):
         """
         response = self.client.get(reverse('tournament-progress', kwargs = dict(pk = self.tournament1.id)))
         self.assertEqual(response.status_code, 200)
+        self.tournament1.refresh_from_db()
         self.assertEqual(self.tournament1.state, 'active')
         self.assertContains(response, '<h2>Preliminaries <small class="text-muted">Current Stage</small></h2>')
 
@@ -771,6 +1029,27 @@ class TournamentProgressViewTests(TestCase):
         )
         self.assertEqual(response.status_code, 412)
 
+    def test_post_accounted_once(self):
+        self.test_open() ## start the tournament
+        stage = self.tournament1.current_stage
+        fixture = stage.fixtures.filter(level = stage.current_level)[0]
+        required_confirmations_count = self.tournament1.required_confirmations_count
+
+        # Only the confirmation which crosses the number of required confirmations accounts the fixture.
+        for user in self.users[:required_confirmations_count + 1]:
+            self.client.force_login(user)
+            self.client.post(
+                reverse('tournament-progress', kwargs = dict(pk = self.tournament1.id)),
+                dict(
+                    fixture_id = fixture.id,
+                    score1 = '12',
+                    score2 = '10',
+                ),
+            )
+        self.assertEqual(fixture.confirmations.count(), required_confirmations_count + 1)
+        self.assertEqual(stage.standings_rows.get(participant = fixture.player1).points, 3)
+        self.assertEqual(stage.standings_rows.get(participant = fixture.player1).matches, 1)
+
     def test_post_invalid_score(self):
         self.test_open() ## start the tournament
         self.client.force_login(self.users[0])
@@ -809,6 +1088,275 @@ class TournamentProgressViewTests(TestCase):
         self.assertContains(response, 'Confirmations: 1 / 6')
         self.assertContains(response, 'You have confirmed.')
 
+    def test_spectator_cache(self):
+        self.test_open() ## start the tournament
+        self.client.logout()
+        caches['fragments'].clear() ## the creator is a spectator too
+        url = reverse('tournament-progress', kwargs = dict(pk = self.tournament1.id))
+
+        # The stages are rendered for the first spectator, and served from the cache for the second.
+        with CaptureQueriesContext(connection) as queries1:
+            response1 = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries2:
+            response2 = self.client.get(url)
+        self.assertEqual(response1.content, response2.content)
+        self.assertLess(len(queries2), len(queries1))
+        self.assertNotContains(response2, 'csrfmiddlewaretoken')
+
+        # Participants are not served from the cache.
+        self.client.force_login(self.users[0])
+        response = self.client.get(url)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+        # A score change bumps the revision, so that spectators see the updated stages.
+        revision = models.Tournament.objects.get(id = self.tournament1.id).revision
+        fixture = self.tournament1.current_stage.current_fixtures[0]
+        self.client.post(url, dict(fixture_id = fixture.id, score1 = '10', score2 = '12'))
+        self.assertEqual(models.Tournament.objects.get(id = self.tournament1.id).revision, revision + 1)
+
+        self.client.logout()
+        response = self.client.get(url)
+        self.assertNotEqual(response.content, response2.content)
+        self.assertRegex(response.content.decode(), r'padding: 0;">\s*10\s*</div>')
+
+
+class TournamentProgressJsonViewTests(TestCase):
+
+    def setUp(self):
+        self.user1 = models.User.objects.create(username = 'test1')
+        self.tournament1 = models.Tournament.load(definition = test_tournament1_yml, name = 'Test1', creator = self.user1, published = True)
+        self.users = start_tournament(self.tournament1, num_users = 10)
+        self.url = reverse('tournament-progress-json', kwargs = dict(pk = self.tournament1.id))
+
+    def test_not_found(self):
+        response = self.client.get(reverse('tournament-progress-json', kwargs = dict(pk = 0)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_open(self):
+        self.tournament1.reset()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 412)
+
+    def test(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"{self.tournament1.id}-{self.tournament1.revision}"')
+
+        data = response.json()
+        self.assertEqual(data['state'], 'active')
+        self.assertEqual([stage['identifier'] for stage in data['stages']], ['preliminaries', 'main_round', 'playoffs'])
+
+        preliminaries = data['stages'][0]
+        fixture = preliminaries['levels'][0]['fixtures'][0]
+        self.assertEqual(preliminaries['mode'], 'groups')
+        self.assertEqual(preliminaries['current_level'], 0)
+        self.assertIsNone(fixture['score'])
+        self.assertEqual(fixture['confirmations_count'], 0)
+        self.assertEqual(fixture['required_confirmations_count'], 6)
+        self.assertFalse(fixture['confirmed'])
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+
+        # Unchanged polls yield 304, by a single query for the revision.
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH = etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        # Submitting a score changes the ETag.
+        fixture = self.tournament1.current_stage.current_fixtures[0]
+        self.client.force_login(self.users[0])
+        self.client.post(reverse('tournament-progress', kwargs = dict(pk = self.tournament1.id)), dict(fixture_id = fixture.id, score1 = '10', score2 = '12'))
+        self.client.logout()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH = etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['stages'][0]['levels'][0]['fixtures'][0]['score'], [10, 12])
+
+    def test_renamed(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+
+        # Renaming the tournament changes the ETag.
+        self.tournament1.name = 'Renamed'
+        self.tournament1.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH = etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['name'], 'Renamed')
+
+
+class SQLProfilingMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.user1 = models.User.objects.create(username = 'test1', is_staff = True)
+        self.user2 = models.User.objects.create(username = 'test2')
+        self.tournament1 = models.Tournament.load(definition = test_tournament1_yml, name = 'Test1', creator = self.user1, published = True)
+        start_tournament(self.tournament1, num_users = 10)
+        caches['fragments'].clear()
+        profiling.store.clear()
+
+    def test_disabled(self):
+        response = self.client.get(reverse('tournament-progress', kwargs = dict(pk = self.tournament1.id)))
+        self.assertNotIn('X-SQL-Profile', response)
+        self.assertEqual(profiling.store.list(), [])
+
+    def test(self):
+        with self.settings(SQL_PROFILING_SAMPLE_RATE = 1):
+            response = self.client.get(reverse('tournament-progress', kwargs = dict(pk = self.tournament1.id)))
+        m = re.match(r'^id=([0-9a-f]+); queries=([0-9]+); duplicates=([0-9]+); time=[0-9.]+$', response['X-SQL-Profile'])
+        self.assertIsNotNone(m, response['X-SQL-Profile'])
+        profile_id, queries_count = m.group(1), int(m.group(2))
+        self.assertGreater(queries_count, 0)
+
+        # Retrieve the full profile.
+        self.client.force_login(self.user1)
+        profile = self.client.get(reverse('sql-profile', kwargs = dict(profile_id = profile_id))).json()
+        self.assertEqual(profile['view'], 'tournament-progress')
+        self.assertEqual(profile['status'], 200)
+        self.assertEqual(sum(group['queries'] for group in profile['groups']), queries_count)
+        group_names = [group['name'] for group in profile['groups']]
+        self.assertIn('frontend.views.TournamentProgressView.get_context_data', group_names)
+        self.assertIn('tournaments.models.Tournament.load_stage_states', group_names)
+        for entry in profile['repeated']:
+            self.assertGreater(entry['count'], 1)
+
+        # List the recent profiles.
+        profiles = self.client.get(reverse('sql-profiles')).json()['profiles']
+        self.assertEqual(profiles[-1]['id'], profile_id)
+        self.assertNotIn('groups', profiles[-1])
+
+    async def test_async(self):
+        with self.settings(SQL_PROFILING_SAMPLE_RATE = 1):
+            response = await self.async_client.get(reverse('tournament-progress', kwargs = dict(pk = self.tournament1.id)))
+        m = re.match(r'^id=([0-9a-f]+); queries=([0-9]+); duplicates=([0-9]+); time=[0-9.]+$', response['X-SQL-Profile'])
+        self.assertIsNotNone(m, response['X-SQL-Profile'])
+        self.assertGreater(int(m.group(2)), 0)
+
+    def test_async_concurrent(self):
+        url = reverse('tournament-progress', kwargs = dict(pk = self.tournament1.id))
+
+        async def get_concurrently():
+            return await asyncio.gather(*[self.async_client.get(url) for _ in range(5)])
+
+        with self.settings(SQL_PROFILING_SAMPLE_RATE = 1):
+            with CaptureQueriesContext(connection) as queries:
+                responses = async_to_sync(get_concurrently)()
+
+        # Each query is recorded by the profile of the request that issued it (the requests share a connection).
+        queries_counts = [int(re.search(r'queries=([0-9]+)', response['X-SQL-Profile']).group(1)) for response in responses]
+        self.assertEqual(sum(queries_counts), len(queries))
+
+    def test_async_capable(self):
+        async def get_response(request):
+            pass
+        with self.settings(SQL_PROFILING_SAMPLE_RATE = 1):
+            middleware = profiling.SQLProfilingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+    def test_sample_rate(self):
+        with self.settings(SQL_PROFILING_SAMPLE_RATE = 1e-9):
+            response = self.client.get(reverse('tournament-progress', kwargs = dict(pk = self.tournament1.id)))
+        self.assertNotIn('X-SQL-Profile', response)
+
+    def test_forbidden(self):
+        self.client.force_login(self.user2)
+        response = self.client.get(reverse('sql-profiles'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_not_found(self):
+        self.client.force_login(self.user1)
+        response = self.client.get(reverse('sql-profile', kwargs = dict(profile_id = '0')))
+        self.assertEqual(response.status_code, 404)
+
+
+class EventHubTests(SimpleTestCase):
+
+    async def test_publish(self):
+        hub = events.EventHub(max_queue_size = 2)
+        with hub.subscribe(1) as queue1, hub.subscribe(2) as queue2:
+            self.assertEqual(hub.subscribers_count(1), 1)
+
+            # Publish from a different thread.
+            await sync_to_async(hub.publish, thread_sensitive = False)(1, dict(type = 'score'))
+            self.assertEqual(await asyncio.wait_for(queue1.get(), timeout = 1), dict(type = 'score'))
+            self.assertTrue(queue2.empty())
+
+            # Events are dropped for subscribers who do not keep up.
+            for _ in range(3):
+                hub.publish(1, dict(type = 'confirmation'))
+            await asyncio.sleep(0)
+            self.assertEqual(queue1.qsize(), 2)
+
+        self.assertEqual(hub.subscribers_count(1), 0)
+
+
+class TournamentEventsViewTests(TestCase):
+
+    def setUp(self):
+        self.user1 = models.User.objects.create(username = 'test1')
+        self.tournament1 = models.Tournament.load(definition = test_tournament1_yml, name = 'Test1', creator = self.user1, published = True)
+        self.users = start_tournament(self.tournament1, num_users = 10)
+
+    async def test_not_found(self):
+        response = await self.async_client.get(reverse('tournament-events', kwargs = dict(pk = 0)))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_stream(self):
+        response = await self.async_client.get(reverse('tournament-events', kwargs = dict(pk = self.tournament1.id)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = response.streaming_content.__aiter__()
+        self.assertEqual(await stream.__anext__(), b'retry: 3000\n: connected\n\n')
+        events.hub.publish(self.tournament1.id, dict(type = 'score', fixture_id = 1))
+        self.assertEqual(await asyncio.wait_for(stream.__anext__(), timeout = 1), b'event: score\ndata: {"type": "score", "fixture_id": 1}\n\n')
+        await stream.aclose()
+
+    async def test_stream_lifetime(self):
+        response = await self.async_client.get(reverse('tournament-events', kwargs = dict(pk = self.tournament1.id)))
+        with mock.patch.object(views.TournamentEventsView, 'max_lifetime', 0.1):
+            chunks = [chunk async for chunk in response.streaming_content]
+
+        # Verify that the client is told to reconnect, and that the subscription is released.
+        self.assertEqual(chunks[0], b'retry: 3000\n: connected\n\n')
+        self.assertEqual(events.hub.subscribers_count(self.tournament1.id), 0)
+
+    def test_wsgi(self):
+        response = self.client.get(reverse('tournament-events', kwargs = dict(pk = self.tournament1.id)))
+        self.assertEqual(response.status_code, 501)
+
+    def test_progress(self):
+        response = self.client.get(reverse('tournament-progress', kwargs = dict(pk = self.tournament1.id)))
+        self.assertContains(response, f"new EventSource('{reverse('tournament-events', kwargs = dict(pk = self.tournament1.id))}')")
+
+    async def test_post(self):
+        fixture = await sync_to_async(lambda: self.tournament1.current_stage.current_fixtures[0])()
+        with events.hub.subscribe(self.tournament1.id) as queue:
+            await sync_to_async(self.client.force_login)(self.users[0])
+
+            # The events are published once the changes are committed.
+            def post():
+                with self.captureOnCommitCallbacks(execute = True):
+                    self.client.post(
+                        reverse('tournament-progress', kwargs = dict(pk = self.tournament1.id)),
+                        dict(fixture_id = fixture.id, score1 = '10', score2 = '12'),
+                    )
+            await sync_to_async(post)()
+            event1 = await asyncio.wait_for(queue.get(), timeout = 1)
+            event2 = await asyncio.wait_for(queue.get(), timeout = 1)
+
+        self.assertEqual(event1['type'], 'score')
+        self.assertEqual(event1['fixture_id'], fixture.id)
+        self.assertEqual(event1['score'], [10, 12])
+        self.assertEqual(event2['type'], 'confirmation')
+        self.assertEqual(event2['confirmations_count'], 1)
+        self.assertFalse(event2['confirmed'])
+
 
 class ManageParticipantsViewTests(TestCase):
 
@@ -13,8 +13,12 @@ urlpatterns = [
     path('t/join/<int:pk>', views.JoinTournamentView.as_view(), name='join-tournament'),
     path('t/withdraw/<int:pk>', views.WithdrawTournamentView.as_view(), name='withdraw-tournament'),
     path('t/progress/<int:pk>', views.TournamentProgressView.as_view(), name='tournament-progress'),
+    path('t/progress/<int:pk>/json', views.TournamentProgressJsonView.as_view(), name='tournament-progress-json'),
+    path('t/progress/<int:pk>/events', views.TournamentEventsView.as_view(), name='tournament-events'),
     path('t/clone/<int:pk>', views.CloneTournamentView.as_view(), name='clone-tournament'),
     path('t/participants/<int:pk>', views.ManageParticipantsView.as_view(), name='manage-participants'),
+    path('debug/sql-profiles', views.SQLProfilesView.as_view(), name='sql-profiles'),
+    path('debug/sql-profiles/<str:profile_id>', views.SQLProfilesView.as_view(), name='sql-profile'),
     path('accounts/login/', LoginView.as_view(template_name = 'frontend/login.html'), name='login'),
     path('accounts/signup/', views.SignupView.as_view(), name='signup'),
     path('accounts/logout/', LogoutView.as_view(), name='logout'),
@@ -1,18 +1,29 @@
+import asyncio
+import functools
+import json
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.core.cache import caches
 from django.core.exceptions import ValidationError
-from django.db.models import Count, Q
-from django.http import HttpResponse, HttpResponseForbidden
+from django.db import transaction
+from django.db.models import Q
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
-from django.views.generic import ListView, View
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views.generic import View
 from django.views.generic.detail import SingleObjectMixin
 from django.views.generic.edit import FormView
 
 from tournaments import models
 
+from . import caching, events, profiling
 from .forms import CreateTournamentForm, SignupForm, UpdateTournamentForm
-from .git import get_head_info
+from .git import get_version_info
 
 
 class IsCreatorMixin(LoginRequiredMixin, UserPassesTestMixin):
@@ -28,14 +39,12 @@ def create_breadcrumb(items):
 
 class VersionInfoMixin:
 
-    version = get_head_info()
-
     def get_context_data(self, **kwargs):
         if hasattr(super(VersionInfoMixin, self), 'get_context_data'):
             context = super(VersionInfoMixin, self).get_context_data(**kwargs)
         else:
             context = dict()
-        context['version'] = self.version
+        context['version'] = get_version_info()
         return context
 
 
@@ -72,32 +81,56 @@ class SignupView(VersionInfoMixin, View):
             return render(request, 'frontend/signup.html', dict(form = form))
 
 
-class IndexView(VersionInfoMixin, ListView):
+class IndexView(VersionInfoMixin, View):
+    """
+    Lists the tournaments by state, along with the all-stars.
 
-    context_object_name = 'tournaments'
-    queryset = models.Tournament.objects
-    template_name = 'frontend/index.html'
+    The view is asynchronous: The tournaments and all-stars are loaded by the async ORM (one query each), and only
+    rendering (which follows relations of the tournaments) runs as synchronous code in a worker thread. Anonymous users
+    all see the same index, which is thus served from the cache until a tournament changes (see `caching`), or for at
+    most `cache_timeout` seconds.
+    """
 
-    def get_context_data(self, **kwargs):
-        context = super(IndexView, self).get_context_data(**kwargs)
+    cache_timeout = 60
+
+    async def get(self, request, *args, **kwargs):
+        user_id = await sync_to_async(lambda: request.user.id)()
+        if not user_id:
+            cache_key = await caching.get_index_cache_key()
+            content = await caches['fragments'].aget(cache_key)
+            if content is not None:
+                return HttpResponse(content)
+
+        context = self.get_context_data(**kwargs)
         context['breadcrumb'] = create_breadcrumb([
             dict(label = 'Index', url = reverse('index')),
         ])
 
-        published_tournaments = self.queryset.filter(published = True).annotate(
-            fixtures = Count('stages__fixtures'),
-            podium_size = Count('participations', filter = Q(participations__podium_position__isnull = False)))
+        # Load the published tournaments and the drafts of the user at once.
+        tournaments = models.Tournament.objects.filter(~Q(state = 'draft') | Q(creator_id = user_id) if user_id else ~Q(state = 'draft'))
+        for state in ('draft', 'open', 'active', 'finished'):
+            context['drafts' if state == 'draft' else state] = list()
+        async for tournament in tournaments.select_related('creator').order_by('id'):
+            context['drafts' if tournament.state == 'draft' else tournament.state].append(tournament)
 
-        context['drafts']   = self.queryset.filter(published = False, creator = self.request.user) if self.request.user.id else list()
-        context['open']     = published_tournaments.filter(fixtures = 0)
-        context['active']   = published_tournaments.filter(fixtures__gte = 1, podium_size = 0)
-        context['finished'] = published_tournaments.filter(podium_size__gte = 1)
+        context['allstars'] = await self.get_allstars()
 
-        context['allstars'] = [models.Participation.objects.filter(podium_position = position).annotate(count = Count('participant__name')) for position in range(3)]
-        if not any(context['allstars']):
-            context['allstars'] = None
+        response = await sync_to_async(render)(request, 'frontend/index.html', context)
+        if not user_id:
+            await caches['fragments'].aset(cache_key, response.content, self.cache_timeout)
+        return response
 
-        return context
+    async def get_allstars(self):
+        """
+        Return the participants with the most 1st, 2nd, and 3rd placements, along with the counts of the placements.
+
+        The counts are read from the materialized all-stars rows (one indexed query for each position).
+        """
+        allstars = list()
+        for position in range(3):
+            field = models.AllStarsRow.POSITIONS[position]
+            allstars.append([dict(participant = row.participant, count = getattr(row, field)) async for row in models.AllStarsRow.top(position)])
+        return allstars if any(allstars) else None
 
 
 class CreateTournamentView(LoginRequiredMixin, VersionInfoMixin, FormView):
@@ -228,10 +261,7 @@ class JoinTournamentView(LoginRequiredMixin, SingleObjectMixin, View):
         # Create the participation only if it does not already exist.
         if not self.object.participations.filter(participant__user = request.user).exists():
             participant, created = models.Participant.objects.get_or_create(user = request.user, defaults = {'name': request.user.username})
-            models.Participation.objects.create(
-                tournament = self.object,
-                participant = participant,
-                slot_id = models.Participation.next_slot_id(self.object))
+            models.Participation.create_in_next_slot(self.object, participant)
 
         request.session['alert'] = dict(status = 'success', text = 'You have joined the tournament.')
         return redirect('update-tournament', pk = self.object.id)
@@ -278,40 +308,8 @@ class ManageParticipantsView(IsCreatorMixin, SingleObjectMixin, VersionInfoMixin
         participant_names = request.POST.get('participant_names')
         if participant_names:
             participant_names_list = list(filter(lambda s: len(s) > 0, map(lambda s: s.strip(), participant_names.splitlines())))
+            self.object.update_participants(participant_names_list)
 
-            # Remove participations that are no longer on the list.
-            for participation in list(self.object.participations.all()):
-                if participation.participant.name not in participant_names_list:
-                    participation.delete()
-
-            # Remove participants that are no longer part of any tournament, and not associated with any user.
-            models.Participant.objects.annotate(participations_count = Count('participations')).filter(participations_count = 0, user__isnull = True).delete()
-
-            # Create new participants and participations.
-            for participant_name in participant_names_list:
-
-                # Check whether there is a user with the same name.
-                if models.User.objects.filter(username = participant_name).exists():
-                    user = models.User.objects.get(username = participant_name)
-                    participant = models.Participant.get_or_create_for_user(user)
-                else:
-                    participant = models.Participant.objects.get_or_create(name = participant_name)[0]
-
-                # Create a participation only if it does not already exist.
-                if not self.object.participations.filter(participant = participant).exists():
-                    models.Participation.objects.create(
-                        tournament = self.object,
-                        participant = participant,
-                        slot_id = models.Participation.next_slot_id(self.object)
-                    )
-
-            # Update slots according to the order of the participants in the list.
-            slot_id0 = models.Participation.next_slot_id(self.object)
-            for pidx, participant_name in enumerate(participant_names_list):
-                participation = self.object.participations.get(participant__name = participant_name)
-                participation.slot_id = slot_id0 + pidx
-                participation.save()
-            
             request.session['alert'] = dict(status = 'success', text = 'Attendees have been updated.')
         return redirect('manage-participants', pk = self.object.id)
 
@@ -327,11 +325,20 @@ class ManageParticipantsView(IsCreatorMixin, SingleObjectMixin, VersionInfoMixin
 
 
 class TournamentProgressView(SingleObjectMixin, VersionInfoMixin, AlertMixin, View):
+    """
+    Starts an open tournament, and shows the progress of an active or finished tournament.
+
+    The view is asynchronous: The tournament and the preconditions are loaded by the async ORM, whereas starting the
+    tournament, building the context, rendering, and posting scores run as synchronous code in a worker thread.
+    """
 
     model = models.Tournament
 
-    def get(self, request, *args, **kwargs):
-        self.object = self.get_object()
+    async def get(self, request, *args, **kwargs):
+        try:
+            self.object = await models.Tournament.objects.aget(pk = kwargs['pk'])
+        except models.Tournament.DoesNotExist as error:
+            raise Http404() from error
 
         # Drafted tournaments cannot be started.
         if self.object.state == 'draft':
@@ -340,41 +347,61 @@ class TournamentProgressView(SingleObjectMixin, VersionInfoMixin, AlertMixin, Vi
         if self.object.state == 'open':
 
             # Tournament can only be started by the creator.
-            if self.object.creator is not None and self.object.creator.id != request.user.id:
+            user_id = await sync_to_async(lambda: request.user.id)()
+            if self.object.creator_id is not None and self.object.creator_id != user_id:
                 return HttpResponseForbidden() 
 
             # Check whether there are at least 3 participants.
-            if self.object.participations.count() < 3:
+            if await self.object.participations.acount() < 3:
                 return HttpResponse(status = 412)
 
-            # Perform a test run.
-            try:
-                self.object.test()
-            except ValidationError as error:
-                request.session['alert'] = dict(status = 'danger', text = '\n'.join(error))
-                return redirect('update-tournament', pk = self.object.id)
-
-            # Change tournament state to "active".
-            self.object.shuffle_participants()
-            self.object.update_state()
+            # Perform a test run, and change tournament state to "active".
+            response = await sync_to_async(self.start)(request)
+            if response is not None:
+                return response
 
         if self.object.state in ('active', 'finished'):
-            return render(request, 'frontend/tournament-progress.html', self.get_context_data())
+            return await sync_to_async(self.render_progress)(request)
 
-    def get_level_data(self, stage, level):
+    def start(self, request):
+        """
+        Start the tournament after a test run. Returns a response if the test run fails, and `None` otherwise.
+        """
+        try:
+            self.object.test()
+        except ValidationError as error:
+            request.session['alert'] = dict(status = 'danger', text = '\n'.join(error))
+            return redirect('update-tournament', pk = self.object.id)
+
+        self.object.shuffle_participants()
+        self.object.update_state()
+        return None
+
+    def render_progress(self, request):
+        return render(request, 'frontend/tournament-progress.html', self.get_context_data())
+
+    def get_level_data(self, stage_state, level):
         return {
-            'fixtures': [self.get_fixture_data(stage, level, fixture) for fixture in stage.fixtures.filter(level = level)],
-            'name': stage.get_level_name(level),
+            'fixtures': [self.get_fixture_data(stage_state, level, fixture) for fixture in stage_state.get_fixtures(level)],
+            'name': stage_state.get_level_name(level),
         }
 
-    def get_fixture_data(self, stage, level, fixture):
+    def get_fixture_data(self, stage_state, level, fixture):
         return {
             'data': fixture,
-            'editable': not fixture.is_confirmed and level == stage.current_level and self.request.user.id and stage.tournament.participations.filter(participant__user = self.request.user).count() > 0,
-            'has_confirmed': fixture.confirmations.filter(id = self.request.user.id).count() > 0,
+            'editable': not fixture.is_confirmed and level == stage_state.current_level and self.is_participant,
+            'has_confirmed': fixture.id in self.confirmed_fixture_ids,
         }
 
     def get_context_data(self, **kwargs):
+        """
+        Build the context for rendering the progress of the tournament.
+
+        The stages are rendered separately (see `get_stages_context`). Spectators all see the same stages, so these are
+        served from the fragment cache, keyed by the revision of the tournament (which changes with every score change,
+        confirmation, and stage advance). Participants see their own confirmations and score forms, and are never
+        served from the cache.
+        """
         context = super(TournamentProgressView, self).get_context_data(**kwargs)
         context.update(VersionInfoMixin.get_context_data(self, **kwargs))
         context['breadcrumb'] = create_breadcrumb([
@@ -382,23 +409,78 @@ class TournamentProgressView(SingleObjectMixin, VersionInfoMixin, AlertMixin, Vi
             dict(label = self.object.name, url = self.request.path),
         ])
 
+        # Determine the role of the viewer.
+        self.is_participant = bool(self.request.user.id) and self.object.participations.filter(participant__user = self.request.user).exists()
+        viewer_role = 'participant' if self.is_participant else 'spectator'
+
+        cache = caches['fragments']
+        cache_key = f'tournament-progress-stages:{self.object.id}:{self.object.revision}:{viewer_role}'
+        stages_html = cache.get(cache_key) if viewer_role == 'spectator' else None
+        if stages_html is None:
+            stages_context = self.get_stages_context()
+            stages_context['tournament'] = self.object
+            stages_html = render_to_string('frontend/tournament-progress-stages.html', stages_context, request = self.request)
+            if viewer_role == 'spectator':
+                cache.set(cache_key, stages_html)
+        context['stages_html'] = stages_html
+
+        return context
+
+    def get_stages_context(self):
+        """
+        Build the context for rendering the stages of the tournament.
+
+        Everything required is loaded up front by a fixed number of queries (the stages, the fixtures of all stages along
+        with their players and confirmation counts, and the fixtures confirmed by the viewer), so that the number of
+        queries does not depend on the number of fixtures.
+        """
+        context = dict()
+
+        # Load the fixtures confirmed by the viewer.
+        if self.is_participant:
+            self.confirmed_fixture_ids = frozenset(
+                models.Fixture.confirmations.through.objects.filter(user = self.request.user, fixture__mode__tournament = self.object).values_list('fixture_id', flat = True))
+        else:
+            self.confirmed_fixture_ids = frozenset()
+
         context['stages'] = dict()
-        for stage_idx, stage in enumerate(self.object.stages.all()):
+        context['current_stage'] = None
+        for stage_idx, stage_state in enumerate(self.object.load_stage_states()):
+            stage = stage_state.stage
             context['stages'][stage.id] = dict(
-                levels = [self.get_level_data(stage, level) for level in range(stage.levels)]
+                stage = stage,
+                levels = [self.get_level_data(stage_state, level) for level in range(stage_state.levels)],
+                current_level = stage_state.current_level,
+                standings = None,
             )
 
-            if self.object.current_stage and stage.id == self.object.current_stage.id:
+            if context['current_stage'] is None and not stage_state.is_finished:
                 context['current_stage'] = stage_idx + 1
 
-        if self.object.current_stage is None:
-            context['current_stage'] = self.object.stages.count() + 1
+        if context['current_stage'] is None:
+            context['current_stage'] = len(context['stages']) + 1
+
+        # Load the standings of the groups stages which are displayed (those with more than two participants).
+        for stage_info in list(context['stages'].values())[:context['current_stage']]:
+            stage = stage_info['stage']
+            if isinstance(stage, models.Groups) and stage.groups_info is not None and sum((len(group) for group in stage.groups_info)) > 2:
+                stage_info['standings'] = stage.standings
 
         return context
 
-    def post(self, request, *args, **kwargs):
-        self.object = self.get_object()
-        fixture = models.Fixture.objects.get(id = request.POST.get('fixture_id'))
+    async def post(self, request, *args, **kwargs):
+        return await sync_to_async(self.submit)(request)
+
+    @transaction.atomic
+    def submit(self, request):
+        """
+        Set the score of a fixture, or confirm it, and advance the tournament when the fixture becomes confirmed.
+
+        The tournament and the fixture are locked, so that simultaneous submissions are serialized: Only the confirmation
+        which reaches the required number of confirmations advances the tournament, exactly once.
+        """
+        self.object = self.get_object(self.get_queryset().select_for_update())
+        fixture = models.Fixture.objects.select_for_update().get(id = request.POST.get('fixture_id'))
 
         # Check whether the user is a participator.
         if not request.user.id or self.object.participations.filter(participant__user = request.user).count() == 0:
@@ -409,11 +491,12 @@ class TournamentProgressView(SingleObjectMixin, VersionInfoMixin, AlertMixin, Vi
             return HttpResponse(status = 412)
 
         # Check whether the fixture belongs to the currently active stage.
-        if fixture.mode.id != self.object.current_stage.id:
+        current_stage = self.object.current_stage
+        if fixture.mode.id != current_stage.id:
             return HttpResponse(status = 412)
 
         # Check whether the fixture belongs to the current level.
-        if fixture.level != self.object.current_stage.current_level:
+        if fixture.level != current_stage.current_level:
             return HttpResponse(status = 412)
 
         # Check the score formatting.
@@ -440,18 +523,148 @@ class TournamentProgressView(SingleObjectMixin, VersionInfoMixin, AlertMixin, Vi
 
             fixture.save()
             fixture.confirmations.clear()
+            score_changed = True
+        else:
+            score_changed = False
 
         # Add a confirmation.
         if fixture.confirmations.filter(id = request.user.id).count() == 0:
             fixture.confirmations.add(request.user)
-
-        # Update the state of the tournament as soon as the fixture is fully confirmed.
-        if fixture.is_confirmed:
-            self.object.update_state()
+            confirmation_added = True
+        else:
+            confirmation_added = False
+        confirmations_count = fixture.confirmations.count()
+        required_confirmations_count = self.object.required_confirmations_count
+
+        # Advance the tournament as soon as the fixture is fully confirmed (by the confirmation which crosses the number of
+        # required confirmations, so that the fixture is accounted only once).
+        stage_finished = False
+        if confirmation_added and confirmations_count == required_confirmations_count:
+            stage_finished = self.object.handle_confirmed_fixture(current_stage, fixture)
+
+        elif score_changed or confirmation_added:
+            self.object.bump_revision()
+
+        # Notify the subscribers of the tournament events.
+        if score_changed:
+            self.publish_event('score', fixture_id = fixture.id, score = list(new_score))
+        if confirmation_added:
+            self.publish_event('confirmation', fixture_id = fixture.id, confirmations_count = confirmations_count, confirmed = confirmations_count >= required_confirmations_count)
+        if stage_finished:
+            self.publish_event('stage', stage_id = current_stage.id, state = self.object.state)
 
         request.session['alert'] = dict(status = 'success', text = 'Your confirmation has been saved.')
         return redirect('tournament-progress', pk = self.object.id)
 
+    def publish_event(self, event_type, **data):
+        event = dict(type = event_type, revision = self.object.revision, **data)
+        transaction.on_commit(functools.partial(events.hub.publish, self.object.id, event)) ## never announce uncommitted changes
+
+
+def get_progress_etag(request, pk):
+    """
+    Return the ETag of the progress of a tournament, which is derived from its revision (the tournament itself is not
+    loaded, so that unchanged polls are answered without evaluating the models).
+    """
+    revision = models.Tournament.objects.filter(id = pk).values_list('revision', flat = True).first()
+    return None if revision is None else f'"{pk}-{revision}"'
+
+
+@method_decorator(condition(etag_func = get_progress_etag), name = 'get')
+class TournamentProgressJsonView(SingleObjectMixin, View):
+    """
+    Read-only JSON representation of the progress of a tournament, intended for polling clients.
+
+    The representation is the same for all viewers, and carries a strong ETag, so that polls with an up-to-date ETag
+    yield 304 (not modified).
+    """
+
+    model = models.Tournament
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+
+        # Only active and finished tournaments have progress.
+        if self.object.state not in ('active', 'finished'):
+            return HttpResponse(status = 412)
+
+        data = dict(
+            id = self.object.id,
+            name = self.object.name,
+            state = self.object.state,
+            revision = self.object.revision,
+            stages = [self.get_stage_data(stage_state) for stage_state in self.object.load_stage_states()],
+        )
+        return JsonResponse(data)
+
+    def get_stage_data(self, stage_state):
+        return dict(
+            id = stage_state.stage.id,
+            identifier = stage_state.stage.identifier,
+            name = stage_state.stage.name,
+            mode = type(stage_state.stage).__name__.lower(),
+            current_level = stage_state.current_level,
+            finished = stage_state.is_finished,
+            levels = [
+                dict(
+                    name = stage_state.get_level_name(level),
+                    fixtures = [self.get_fixture_data(fixture) for fixture in stage_state.get_fixtures(level)],
+                )
+                for level in range(stage_state.levels)
+            ],
+        )
+
+    def get_fixture_data(self, fixture):
+        return dict(
+            id = fixture.id,
+            player1 = None if fixture.player1 is None else dict(id = fixture.player1.id, name = fixture.player1.name),
+            player2 = None if fixture.player2 is None else dict(id = fixture.player2.id, name = fixture.player2.name),
+            score = None if fixture.score1 is None or fixture.score2 is None else [fixture.score1, fixture.score2],
+            confirmations_count = fixture.confirmations_count,
+            required_confirmations_count = fixture.required_confirmations_count,
+            confirmed = fixture.is_confirmed,
+        )
+
+
+class TournamentEventsView(View):
+    """
+    Server-sent event stream of the events of a tournament (score submissions, confirmations, and stage advances).
+
+    The events are published by `TournamentProgressView.post` through the in-process broadcast hub. This view is
+    asynchronous, so that open streams do not occupy worker threads, which requires the ASGI application: Under WSGI,
+    the stream would be consumed entirely before sending it, so it is refused (501).
+
+    Django does not notice disconnected clients while streaming, therefore each stream is closed after `max_lifetime`,
+    and the client reconnects after the advertised `retry` delay (this is done by `EventSource` automatically).
+    """
+
+    keepalive_interval = 15 ## seconds
+    max_lifetime = 300 ## seconds
+    retry = 3000 ## milliseconds
+
+    async def get(self, request, pk):
+        if not hasattr(request, 'scope'):
+            return HttpResponse('Event streams require the ASGI application.', status = 501, content_type = 'text/plain')
+        if not await models.Tournament.objects.filter(id = pk).aexists():
+            raise Http404()
+        response = StreamingHttpResponse(self.stream(pk), content_type = 'text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, tournament_id):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_lifetime
+        with events.hub.subscribe(tournament_id) as queue:
+            yield f'retry: {self.retry}\n: connected\n\n'
+            while loop.time() < deadline:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout = min(self.keepalive_interval, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f'event: {event["type"]}\ndata: {json.dumps(event)}\n\n'
+
 
 class CloneTournamentView(LoginRequiredMixin, SingleObjectMixin, View):
 
@@ -465,3 +678,25 @@ class CloneTournamentView(LoginRequiredMixin, SingleObjectMixin, View):
             creator = request.user)
         request.session['alert'] = dict(status = 'success', text = f'A copy of the tournament "{ self.object.name }" has been created (see below).')
         return redirect('update-tournament', pk = tournament.id)
+
+
+class SQLProfilesView(View):
+    """
+    Read-only JSON representation of the recent SQL profiles (see `profiling.SQLProfilingMiddleware`), for staff users.
+
+    Without a `profile_id`, the summaries of the recent profiles are listed (most recent first), and the full profile is
+    returned otherwise.
+    """
+
+    def get(self, request, profile_id = None, *args, **kwargs):
+        if not request.user.is_staff:
+            return HttpResponseForbidden()
+
+        if profile_id is None:
+            summary_keys = ('id', 'method', 'path', 'view', 'status', 'queries', 'time', 'duplicates')
+            return JsonResponse(dict(profiles = [{key: profile[key] for key in summary_keys} for profile in profiling.store.list()]))
+
+        profile = profiling.store.get(profile_id)
+        if profile is None:
+            raise Http404()
+        return JsonResponse(profile)
@@ -22,11 +22,7 @@ def reset_tournament(modeladmin, request, queryset):
     for tournament in queryset.all():
         if tournament.state not in ('active', 'finished'):
             continue
-        for participation in tournament.participations.all():
-            participation.podium_position = None
-            participation.save()
-        for stage in tournament.stages.all():
-            stage.fixtures.all().delete()
+        tournament.reset()
         assert tournament.state == 'open'
 
 
@@ -34,7 +30,7 @@ def reset_tournament(modeladmin, request, queryset):
 class TournamentAdmin(admin.ModelAdmin):
 
     list_display = ('name', 'published', 'state', 'creator')
-    list_filter  = ('published', 'creator')
+    list_filter  = ('published', 'state', 'creator')
 
     actions = [reset_tournament]
 
@@ -54,9 +50,6 @@ class TournamentAdmin(admin.ModelAdmin):
         ParticipationInline,
     ]
 
-    def state(self, obj):
-        return obj.state
-
     ordering = ('name',)
 
 
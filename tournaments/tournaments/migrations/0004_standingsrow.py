@@ -0,0 +1,56 @@
+# Generated by Django 4.2.15 on 2026-10-17 06:44
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+from tournaments.models import compute_standings
+
+
+def rebuild_standings(apps, schema_editor):
+    Groups = apps.get_model('tournaments', 'Groups')
+    Fixture = apps.get_model('tournaments', 'Fixture')
+    Participation = apps.get_model('tournaments', 'Participation')
+    StandingsRow = apps.get_model('tournaments', 'StandingsRow')
+    db_alias = schema_editor.connection.alias
+    for stage in Groups.objects.using(db_alias).all():
+        if stage.groups_info is None:
+            continue
+        required_confirmations_count = 1 + Participation.objects.using(db_alias).filter(tournament_id=stage.tournament_id, participant__user__isnull=False).count() // 2
+        fixtures = Fixture.objects.using(db_alias).filter(mode_id=stage.id, score1__isnull=False, score2__isnull=False) \
+            .annotate(confirmations_count=Count('confirmations')).filter(confirmations_count__gte=required_confirmations_count) \
+            .values_list('player1_id', 'player2_id', 'score1', 'score2')
+        StandingsRow.objects.using(db_alias).bulk_create([
+            StandingsRow(mode_id=stage.id, group=group_idx, participant_id=row.pop('participant'), **row)
+            for group_idx, group_standings in enumerate(compute_standings(stage.groups_info, list(fixtures)))
+            for row in group_standings
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0003_participant_alter_participation_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StandingsRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group', models.PositiveSmallIntegerField()),
+                ('win_count', models.PositiveIntegerField(default=0)),
+                ('loss_count', models.PositiveIntegerField(default=0)),
+                ('draw_count', models.PositiveIntegerField(default=0)),
+                ('matches', models.PositiveIntegerField(default=0)),
+                ('balance', models.IntegerField(default=0)),
+                ('points', models.PositiveIntegerField(default=0)),
+                ('mode', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings_rows', to='tournaments.mode')),
+                ('participant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings_rows', to='tournaments.participant')),
+            ],
+            options={
+                'unique_together': {('mode', 'participant')},
+            },
+        ),
+        migrations.RunPython(rebuild_standings, migrations.RunPython.noop),
+    ]
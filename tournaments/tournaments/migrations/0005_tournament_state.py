@@ -0,0 +1,34 @@
+# Generated by Django 4.2.15 on 2026-10-17 07:13
+
+from django.db import migrations, models
+
+
+def set_tournament_state(apps, schema_editor):
+    Tournament = apps.get_model('tournaments', 'Tournament')
+    Fixture = apps.get_model('tournaments', 'Fixture')
+    Participation = apps.get_model('tournaments', 'Participation')
+    db_alias = schema_editor.connection.alias
+    for tournament in Tournament.objects.using(db_alias).filter(published=True):
+        if not Fixture.objects.using(db_alias).filter(mode__tournament=tournament).exists():
+            tournament.state = 'open'
+        elif Participation.objects.using(db_alias).filter(tournament=tournament, podium_position__isnull=False).exists():
+            tournament.state = 'finished'
+        else:
+            tournament.state = 'active'
+        tournament.save(update_fields=['state'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0004_standingsrow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tournament',
+            name='state',
+            field=models.CharField(choices=[('draft', 'draft'), ('open', 'open'), ('active', 'active'), ('finished', 'finished')], db_index=True, default='draft', editable=False, max_length=8),
+        ),
+        migrations.RunPython(set_tournament_state, migrations.RunPython.noop),
+    ]
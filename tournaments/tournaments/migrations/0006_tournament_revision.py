@@ -0,0 +1,18 @@
+# Generated by Django 4.2.15 on 2026-10-17 07:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0005_tournament_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tournament',
+            name='revision',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.15 on 2026-10-17 07:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_allstars_rows(apps, schema_editor):
+    AllStarsRow = apps.get_model('tournaments', 'AllStarsRow')
+    Participation = apps.get_model('tournaments', 'Participation')
+    db_alias = schema_editor.connection.alias
+    rows = dict()
+    for participation in Participation.objects.using(db_alias).filter(podium_position__lt=3):
+        row = rows.setdefault(participation.participant_id, AllStarsRow(participant_id=participation.participant_id))
+        field = ('gold', 'silver', 'bronze')[participation.podium_position]
+        setattr(row, field, getattr(row, field) + 1)
+    AllStarsRow.objects.using(db_alias).bulk_create(rows.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0006_tournament_revision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AllStarsRow',
+            fields=[
+                ('participant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='allstars_row', serialize=False, to='tournaments.participant')),
+                ('gold', models.PositiveIntegerField(default=0)),
+                ('silver', models.PositiveIntegerField(default=0)),
+                ('bronze', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-gold', 'participant'], name='allstars_gold_idx'), models.Index(fields=['-silver', 'participant'], name='allstars_silver_idx'), models.Index(fields=['-bronze', 'participant'], name='allstars_bronze_idx')],
+            },
+        ),
+        migrations.RunPython(create_allstars_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.15 on 2026-10-17 10:49
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0007_allstarsrow'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='groups',
+            name='max_group_size',
+            field=models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(32767)]),
+        ),
+        migrations.AlterField(
+            model_name='groups',
+            name='min_group_size',
+            field=models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(32767)]),
+        ),
+    ]
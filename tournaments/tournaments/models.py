@@ -1,12 +1,17 @@
+import copy
+import functools
 import math
 import random
 import re
 
 import numpy as np
+import yaml
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from django.db import models, transaction
-from django.db.models import CheckConstraint, Max, Min, Q, QuerySet
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import IntegrityError, models, transaction
+from django.db.models import CheckConstraint, Count, F, Max, Q, QuerySet, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.db.models.signals import pre_delete
 from django.dispatch import receiver
 from polymorphic.models import PolymorphicModel
@@ -19,47 +24,85 @@ class Tournament(models.Model):
     podium_spec = models.JSONField()
     published = models.BooleanField(default = False)
     creator = models.ForeignKey('auth.User', on_delete = models.SET_NULL, related_name = 'tournaments', null = True, blank = True)
+    state = models.CharField(max_length = 8, choices = [(state, state) for state in ('draft', 'open', 'active', 'finished')], default = 'draft', db_index = True, editable = False)
+    revision = models.PositiveIntegerField(default = 0, editable = False)
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # The "draft" and "open" states follow from the `published` flag, the other states are set when advancing (see
+        # `_set_state`). The state is thus only written if the flag is, so that saving a stale instance does not roll back
+        # the persisted state, and only derived from the flag as long as the tournament was not started. For the same
+        # reason, the revision is never written by saves, but only incremented by `bump_revision`.
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            derive_state = self._state.adding or self.published != getattr(self, '_loaded_published', None)
+        else:
+            derive_state = 'published' in update_fields
+        derive_state = derive_state and not self.has_fixtures()
+        if derive_state:
+            if not self.published:
+                self.state = 'draft'
+            elif self.state == 'draft':
+                self.state = 'open'
+        if not self._state.adding:
+            if update_fields is None:
+                update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key and field.name != 'state']
+            kwargs['update_fields'] = {*update_fields, *(['state'] if derive_state else [])} - {'revision'}
+        super(Tournament, self).save(*args, **kwargs)
+        self._loaded_published = self.published
+
+        # Edits of the tournament (e.g., renaming it) change its representations, like its progress does.
+        if len(kwargs.get('update_fields', set()) - {'state'}) > 0:
+            self.bump_revision()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        tournament = super(Tournament, cls).from_db(db, field_names, values)
+        tournament._loaded_published = tournament.__dict__.get('published')
+        return tournament
+
+    def has_fixtures(self):
+        """
+        Tell whether any stage of the tournament has fixtures (i.e. the tournament was started).
+        """
+        return not self._state.adding and Fixture.objects.filter(mode__tournament = self).exists()
+
+    def _set_state(self, state):
+        """
+        Persist the `state` of a published tournament (unpublished tournaments remain in "draft" state).
+        """
+        if self.published and self.state != state:
+            self.state = state
+            self.save(update_fields = ['state'])
+
+    def bump_revision(self):
+        """
+        Increment the revision of the tournament, which must be done whenever the progress changes (a score is changed, a
+        fixture is confirmed, or the tournament advances), or the tournament is edited (see `save`). The revision
+        identifies the cached renderings of the progress.
+        """
+        Tournament.objects.filter(id = self.id).update(revision = F('revision') + 1)
+        self.refresh_from_db(fields = ['revision'])
+
     @staticmethod
     def load(definition, name, **kwargs):
         if isinstance(definition, str):
-            import yaml
             definition_str = definition
-            definition = yaml.safe_load(definition)
+            compiled_definition = compile_definition(definition)
         else:
+            assert isinstance(definition, dict), repr(definition)
             definition_str = None
+            compiled_definition = CompiledDefinition(definition)
 
-        assert isinstance(definition, dict), repr(definition)
-        if len(definition['podium']) == 0:
+        if len(compiled_definition.podium_spec) == 0:
             raise ValidationError('No podium definition given.')
 
-        tournament = Tournament.objects.create(name = name, podium_spec = definition['podium'], definition = definition_str, **kwargs)
-
-        for stage in definition['stages']:
-            stage = {key.replace('-', '_'): value for key, value in stage.items()}
-            stage['tournament'] = tournament
-
-            if 'id' in stage.keys( ):
-                stage['identifier'] = stage.pop('id')
-
-            mode_type = stage.pop('mode')
-
-            if mode_type == 'groups':
-                Groups.objects.create(**stage)
-
-            elif mode_type == 'knockout':
-                Knockout.objects.create(**stage)
-
-            elif mode_type == 'division':
-                stage['min_group_size'] = 2
-                stage['max_group_size'] = 32767 ## https://docs.djangoproject.com/en/5.0/ref/models/fields/#positivesmallintegerfield
-                Groups.objects.create(**stage)
-
-            else:
-                raise ValidationError(f'Unknown mode: "{mode_type}".')
+        tournament = Tournament.objects.create(name = name, podium_spec = copy.deepcopy(compiled_definition.podium_spec), definition = definition_str, **kwargs)
+        for stage in compiled_definition.build_stages():
+            stage.tournament = tournament
+            stage.save()
 
         return tournament
 
@@ -80,80 +123,188 @@ class Tournament(models.Model):
 
     @property
     def current_stage(self):
+        required_confirmations_count = self.required_confirmations_count
         for stage in self.stages.all():
-            if not stage.is_finished:
+            if not stage.load_state(required_confirmations_count).is_finished:
                 return stage
         return None ## indicates that the tournament is finished
 
+    def load_stage_states(self):
+        """
+        Load the states of all stages by a fixed number of queries (the fixtures of all stages are loaded at once, along
+        with their players and confirmation counts).
+        """
+        fixtures = Fixture.objects.filter(mode__tournament = self).annotate_confirmations(self.required_confirmations_count)
+        fixtures_by_stage = dict()
+        for fixture in fixtures.select_related('player1', 'player2'):
+            fixtures_by_stage.setdefault(fixture.mode_id, list()).append(fixture)
+        return [stage.load_state(fixtures = fixtures_by_stage.get(stage.id, list())) for stage in self.stages.all()]
+
+    @property
+    def required_confirmations_count(self):
+        """
+        The number of confirmations required for each fixture of the tournament (more than half of the participating users).
+        """
+        return 1 + self.participations.filter(participant__user__isnull = False).count() // 2
+
     @transaction.atomic
-    def shuffle_participants(self):
-        count = self.participations.count()
-        if count == 0:
+    def shuffle_participants(self, seed = None):
+        """
+        Randomly permute the slots of the participants. The permutation is reproducible if a `seed` is given.
+
+        The slots are updated by at most two bulk queries, regardless of the number of participants.
+        """
+        participations = list(self.participations.all())
+        if len(participations) == 0:
             return ## early out, so that min/max operations below are well defined
-        new_slot_ids = list(range(count))
-        random.shuffle(new_slot_ids)
+        new_slot_ids = list(range(len(participations)))
+        random.Random(seed).shuffle(new_slot_ids)
+
+        # SQLite does not support deferred unique constraints, therefore we need to work around: If any value of
+        # `new_slot_ids` is already taken, the slots are first moved beyond the taken ones to establish uniqueness.
+        if min(participation.slot_id for participation in participations) < len(participations):
+            max_slot_id = max(participation.slot_id for participation in participations)
+            for pidx, participation in enumerate(participations):
+                participation.slot_id = max_slot_id + 1 + pidx
+            Participation.objects.bulk_update(participations, ['slot_id'])
+
+        # Now the values of `new_slot_ids` can be assigned directly.
+        for new_slot_id, participation in zip(new_slot_ids, participations):
+            participation.slot_id = new_slot_id
+        Participation.objects.bulk_update(participations, ['slot_id'])
 
-        # SQLite does not support deferred unique constraints, therefore we need to work around.
-        min_slot_id = self.participations.aggregate(Min('slot_id'))['slot_id__min']
-        max_slot_id = self.participations.aggregate(Max('slot_id'))['slot_id__max']
+    def update_state(self):
+        """
+        Determine the current stage from scratch, and advance the tournament accordingly.
 
-        # If any value of `new_slot_ids` is already taken, add an offset to establish uniqueness.
-        if min_slot_id < count:
-            for new_slot_id, participation in zip(new_slot_ids, self.participations.all()):
-                participation.slot_id = max_slot_id + 1 + new_slot_id
-                participation.save()
+        The standings of the stages are rebuilt first, so that fixtures which were confirmed without being accounted (see
+        `handle_confirmed_fixture`) are taken into account. The fixtures of the current stage are created if there are none yet, and pending updates of the fixtures are
+        performed otherwise. If the tournament is finished, the podium positions are set. This is used to start the
+        tournament, whereas `handle_confirmed_fixture` is used to advance the tournament when a fixture is confirmed.
+        """
+        required_confirmations_count = self.required_confirmations_count
+        for stage in self.stages.all():
+            stage.rebuild_standings(required_confirmations_count)
 
-        # Otherwise, the values of `new_slot_ids` can be assigned directly.
+        current_stage = self.current_stage
+        if current_stage is None:
+            self.update_podium()
         else:
-            for new_slot_id, participation in zip(new_slot_ids, self.participations.all()):
-                participation.slot_id = new_slot_id
-                participation.save()
+            current_stage.update_state()
+            self._set_state('active')
+        self.bump_revision()
 
-    def update_state(self):
-        if self.current_stage is None:
+    @transaction.atomic
+    def handle_confirmed_fixture(self, stage, fixture):
+        """
+        Advance the tournament after the `fixture` of the `stage` has become confirmed.
 
-            # If the tournament is finished, update the podium positions.
-            podium = self._get_podium()
-            for position, participant in enumerate(podium):
-                participation = self.participations.get(participant = participant)
-                participation.podium_position = position
-                participation.save()
+        Only the affected stage is updated: The result of the fixture is accounted by the stage, and if the stage is
+        finished by that, the fixtures of the next stage are created (or the podium positions are set, if it was the last
+        stage). The cost is thus proportional to the change, and not to the size of the tournament.
 
-        else:
+        Returns `True` if the stage is finished by that, and `False` otherwise.
+        """
+        assert fixture.mode_id == stage.id
+        stage.account_fixture(fixture)
+
+        # Advance to the next stage, if the stage is finished.
+        stage_finished = stage.load_state().is_finished
+        if stage_finished:
+            stages = list(self.stages.all())
+            next_stages = stages[[s.id for s in stages].index(stage.id) + 1:]
+            if len(next_stages) > 0:
+                next_stages[0].update_state()
+            else:
+                self.update_podium()
+        self.bump_revision()
+        return stage_finished
+
+    def update_podium(self):
+        podium = self._get_podium()
+        for position, participant in enumerate(podium):
+            participation = self.participations.get(participant = participant)
+            participation.podium_position = position
+            participation.save()
+        AllStarsRow.rebuild(participant.id for participant in podium)
+        self._set_state('finished')
 
-            # Propagate `update_state` to the current stage as long as updates happen.
-            while self.current_stage.update_state():
-                pass
+    @transaction.atomic
+    def reset(self):
+        """
+        Reset an active or finished tournament to the "open" state, by removing all fixtures and podium positions.
+        """
+        podium_participant_ids = list(self.participations.filter(podium_position__isnull = False).values_list('participant_id', flat = True))
+        self.participations.update(podium_position = None)
+        AllStarsRow.rebuild(podium_participant_ids)
+        for stage in self.stages.all():
+            stage.fixtures.all().delete()
+            stage.rebuild_standings()
+        self._set_state('open')
+        self.bump_revision()
 
-    @property
-    def state(self):
-        if not self.published:
-            return 'draft'
-        if Fixture.objects.filter(mode__tournament = self).count() == 0:
-            return 'open'
-        if self.current_stage is not None:
-            return 'active'
-        else:
-            return 'finished'
+    @transaction.atomic
+    def update_participants(self, participant_names):
+        """
+        Synchronize the participations with a list of participant names, which also determines the order of the slots.
+
+        Participations of participants not on the list are removed, and participants who are no longer part of any
+        tournament (and not associated with any user) are deleted. Missing participants are created (associated with the
+        user of the same name, if there is one). The changes are computed in memory, and applied by bulk queries, so that
+        the number of queries does not depend on the number of participants. Note that bulk creations and updates do not
+        send any signals.
+        """
+        participant_names = list(dict.fromkeys(participant_names)) ## remove duplicates, but preserve the order
+        participations = list(self.participations.select_related('participant'))
+
+        # Remove participations that are no longer on the list.
+        removed_participation_ids = [participation.id for participation in participations if participation.participant.name not in participant_names]
+        if len(removed_participation_ids) > 0:
+            Participation.objects.filter(id__in = removed_participation_ids).delete()
+            participations = [participation for participation in participations if participation.id not in removed_participation_ids]
+
+        # Remove participants that are no longer part of any tournament, and not associated with any user.
+        Participant.objects.annotate(participations_count = Count('participations')).filter(participations_count = 0, user__isnull = True).delete()
+
+        # Determine the participants for the names on the list (participants of users take precedence).
+        users = {user.username: user for user in User.objects.filter(username__in = participant_names)}
+        user_participants = {participant.user_id: participant for participant in Participant.objects.filter(user__in = users.values())}
+        named_participants = {participant.name: participant for participant in Participant.objects.filter(name__in = participant_names)}
+        participants = dict()
+        for participant_name in participant_names:
+            user = users.get(participant_name)
+            if user is None:
+                participants[participant_name] = named_participants.get(participant_name)
+            else:
+                participants[participant_name] = user_participants.get(user.id)
+
+        # Create the missing participants (re-fetched afterwards, since not all databases return the primary keys).
+        missing_participant_names = [participant_name for participant_name, participant in participants.items() if participant is None]
+        if len(missing_participant_names) > 0:
+            Participant.objects.bulk_create([Participant(name = participant_name, user = users.get(participant_name)) for participant_name in missing_participant_names])
+            participants.update({participant.name: participant for participant in Participant.objects.filter(name__in = missing_participant_names)})
+
+        # Create the missing participations, and update the slots according to the order of the list. The slots are
+        # shifted beyond the current slots, so that they never collide with them.
+        slot_id0 = max((participation.slot_id for participation in participations), default = -1) + 1
+        participations = {participation.participant_id: participation for participation in participations}
+        created_participations = list()
+        for pidx, participant_name in enumerate(participant_names):
+            participant = participants[participant_name]
+            participation = participations.get(participant.id)
+            if participation is None:
+                created_participations.append(Participation(tournament = self, participant = participant, slot_id = slot_id0 + pidx))
+            else:
+                participation.slot_id = slot_id0 + pidx
+        Participation.objects.bulk_create(created_participations)
+        Participation.objects.bulk_update(participations.values(), ['slot_id'])
 
     @property
     def podium(self):
         return Participant.objects.filter(participations__tournament = self, participations__podium_position__isnull = False).order_by('participations__podium_position')
 
     def _get_podium(self):
-        podium = list()
-        for identifier, position in parse_participants_str_list(self.podium_spec):
-
-            try:
-                podium_chunk = unwrap_list(self.stages.get(identifier = identifier).placements[position])
-            except IndexError as error:
-                raise ValueError(f'insufficient participants: {identifier}[{position}] is out of range') from error
-
-            if isinstance(podium_chunk, list):
-                podium += podium_chunk
-            else:
-                podium.append(podium_chunk)
-        return podium
+        return resolve_participants_str_list(self.podium_spec, lambda identifier: self.stages.get(identifier = identifier).placements)
 
     def clean(self):
         super(Tournament, self).clean()
@@ -166,62 +317,31 @@ class Tournament(models.Model):
         except Exception as error:
             raise ValidationError(f'Error parsing "podium" definition ({error}).') from error
 
-    @transaction.atomic
     def test(self):
-        tournament = Tournament.load(definition = self.definition, name = 'Test')
-        for participating_name in (f'--testuser-{pidx}' for pidx in range(len(self.participants))):
-            participant = Participant.objects.get_or_create(name = participating_name)[0]
-            Participation.objects.create(participant = participant, tournament = tournament, slot_id = Participation.next_slot_id(tournament))
-
-        # Initialize the tournament.
-        try:
-            tournament.update_state()
-        except Exception as error:
-            raise ValidationError(f'Error while initializing tournament ({error}).') from error
-
-        # Play through the tournament, always make the participant with the higher ID win.
-        while tournament.current_stage is not None:
-
-            assert tournament.current_stage.fixtures.count() > 0
-            try:
-
-                # Play the current level, then update the tournament state.
-                for fixture in tournament.current_stage.current_fixtures:
-
-                    # If there are only virtual participants...
-                    if tournament.participating_users.count() == 0:
-                        
-                        # ...and the tournament has a creator, then the creator will confirm the fixture.
-                        if self.creator is not None:
-                            fixture.confirmations.add(self.creator)
-                        
-                        # ...and the tournament has no creator, then the fixture will be confirmed by an arbitrary user.
-                        else:
-                            fixture.confirmations.add(User.objects.first())
-
-                    # Otherwise, the participating users will confirm the fixture.
-                    else:
-                        for user in tournament.participating_users[:fixture.required_confirmations_count]:
-                            fixture.confirmations.add(user)
-
-                    fixture.score = (fixture.player1.id, fixture.player2.id)
-                    fixture.save()
-
-                tournament.update_state()
-
-            except Exception as error:
-                if tournament.current_stage is None:
-                    raise ValidationError(f'Error while validating podium ({error}).') from error
-                else:
-                    raise ValidationError(f'Error while validating "{tournament.current_stage.identifier}" stage ({error}).') from error
+        """
+        Validate that the tournament can be played with the current number of participants, by a dry run in memory (see
+        `simulate_tournament`). Raises a `ValidationError` otherwise.
 
-        transaction.set_rollback(True)
+        The stages are built from the compiled definition (see `compile_definition`), if the tournament was loaded from
+        YAML, and loaded from the database otherwise.
+        """
+        if self.definition is None:
+            stages, podium_spec = list(self.stages.all()), self.podium_spec
+        else:
+            compiled_definition = compile_definition(self.definition)
+            stages, podium_spec = compiled_definition.build_stages(), compiled_definition.podium_spec
+        simulate_tournament(stages, podium_spec, self.participations.count())
 
 
 @receiver(pre_delete, sender=Tournament)
 def delete_tournament_stages(sender, instance, **kwargs):
     instance.stages.non_polymorphic().all().delete()
 
+    # Withdraw the placements of the tournament from the all-stars.
+    podium_participant_ids = list(instance.participations.filter(podium_position__isnull = False).values_list('participant_id', flat = True))
+    instance.participations.update(podium_position = None)
+    AllStarsRow.rebuild(podium_participant_ids)
+
 
 class Participant(models.Model):
     user = models.ForeignKey('auth.User', on_delete = models.SET_NULL, related_name = 'participant', null = True, blank = True)
@@ -264,8 +384,84 @@ class Participation(models.Model):
         return f'{self.participant} in {self.tournament}'
 
     @staticmethod
-    def next_slot_id(tournament):
-        return Participation.objects.filter(tournament = tournament).aggregate(Max('slot_id', default = -1))['slot_id__max'] + 1
+    def create_in_next_slot(tournament, participant, max_attempts = 10):
+        """
+        Create the participation of a participant in the next free slot of a tournament, which is safe under concurrent
+        requests (e.g., joins).
+
+        The slot is determined by a subquery within the insert statement itself, instead of a preceding query which would
+        race with concurrent inserts. On databases that do not serialize inserts (unlike SQLite), two concurrent inserts
+        can still determine the same slot, and the insert of the loser is retried in that case.
+        """
+        max_slot_id = Participation.objects.filter(tournament = tournament).values('tournament').annotate(max_slot_id = Max('slot_id')).values('max_slot_id')
+        for attempt in range(max_attempts):
+            participation = Participation(tournament = tournament, participant = participant, slot_id = Coalesce(Subquery(max_slot_id), -1) + 1)
+            try:
+                with transaction.atomic():
+                    participation.save()
+            except IntegrityError:
+                if attempt + 1 == max_attempts or Participation.objects.filter(tournament = tournament, participant = participant).exists():
+                    raise ## not a conflict of the slots, or the conflicts persist
+            else:
+                participation.refresh_from_db(fields = ['slot_id']) ## the slot was determined by the database
+                return participation
+
+
+class AllStarsRow(models.Model):
+    """
+    Materialized counts of the 1st, 2nd, and 3rd placements of a participant, across all tournaments.
+
+    The rows are updated when podium positions are assigned or withdrawn (see `rebuild`). Only participants with at least
+    one placement have a row, and the counts are indexed, so that the top participants for each position are queried
+    without scanning the participations.
+    """
+
+    POSITIONS = ('gold', 'silver', 'bronze') ## the fields of the counts, by podium position
+
+    participant = models.OneToOneField('Participant', on_delete = models.CASCADE, related_name = 'allstars_row', primary_key = True)
+    gold        = models.PositiveIntegerField(default = 0)
+    silver      = models.PositiveIntegerField(default = 0)
+    bronze      = models.PositiveIntegerField(default = 0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields = ['-gold',   'participant'], name = 'allstars_gold_idx'),
+            models.Index(fields = ['-silver', 'participant'], name = 'allstars_silver_idx'),
+            models.Index(fields = ['-bronze', 'participant'], name = 'allstars_bronze_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.participant} ({self.gold}/{self.silver}/{self.bronze})'
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild(participant_ids):
+        """
+        Recompute the rows of the participants with the given IDs from their participations.
+        """
+        participant_ids = frozenset(participant_ids)
+        rows = dict()
+        counts = Participation.objects.filter(participant_id__in = participant_ids, podium_position__lt = len(AllStarsRow.POSITIONS)) \
+            .values('participant_id', 'podium_position').annotate(count = Count('id')).order_by()
+        for item in counts:
+            row = rows.setdefault(item['participant_id'], AllStarsRow(participant_id = item['participant_id']))
+            setattr(row, AllStarsRow.POSITIONS[item['podium_position']], item['count'])
+
+        AllStarsRow.objects.filter(participant_id__in = participant_ids).delete()
+        AllStarsRow.objects.bulk_create(rows.values())
+
+    @staticmethod
+    def top(position, count = None, offset = 0):
+        """
+        Return the rows of the participants with the most placements at the podium `position` (0 for the 1st placements),
+        paged by `offset` and `count` (all rows if `count` is `None`).
+
+        Ties are broken by the names of the participants. The index of the counts thus determines the top rows, and only
+        the rows of tied counts are sorted by name.
+        """
+        field = AllStarsRow.POSITIONS[position]
+        rows = AllStarsRow.objects.filter(**{f'{field}__gt': 0}).order_by(f'-{field}', 'participant__name', 'participant').select_related('participant')
+        return rows[offset:] if count is None else rows[offset:offset + count]
 
 
 def parse_participants_str_list(participants_str_list):
@@ -307,6 +503,242 @@ def unwrap_list(items):
         return items
 
 
+def resolve_participants_str_list(participants_str_list, get_placements):
+    """
+    Resolve a list of placement references (e.g., `played_by` or `podium`) to the list of participants.
+
+    The placements of a stage are obtained by calling `get_placements` with the identifier of the stage (only once for
+    each stage).
+    """
+    participants = list()
+    placements = dict()
+    for identifier, position in parse_participants_str_list(participants_str_list):
+
+        if identifier not in placements:
+            placements[identifier] = get_placements(identifier)
+
+        try:
+            participants_chunk = unwrap_list(placements[identifier][position])
+        except IndexError as error:
+            raise ValueError(f'insufficient participants: {identifier}[{position}] is out of range') from error
+
+        if isinstance(participants_chunk, list):
+            participants += participants_chunk
+        else:
+            participants.append(participants_chunk)
+    return participants
+
+
+def parse_stage(stage):
+    """
+    Parse a stage of a tournament definition, and return the mode class along with its field values.
+    """
+    stage = {key.replace('-', '_'): value for key, value in stage.items()}
+
+    if 'id' in stage.keys( ):
+        stage['identifier'] = str(stage.pop('id')) ## like the identifiers are saved (e.g., "5" for `id: 5`)
+
+    mode_type = stage.pop('mode')
+
+    if mode_type == 'groups':
+        return Groups, stage
+
+    elif mode_type == 'knockout':
+        return Knockout, stage
+
+    elif mode_type == 'division':
+        stage['min_group_size'] = 2
+        stage['max_group_size'] = 32767 ## https://docs.djangoproject.com/en/5.0/ref/models/fields/#positivesmallintegerfield
+        return Groups, stage
+
+    else:
+        raise ValidationError(f'Unknown mode: "{mode_type}".')
+
+
+def build_stages(definition):
+    """
+    Build the stages of a tournament definition (unsaved, and not associated with any tournament yet).
+    """
+    return [mode_class(**fields) for mode_class, fields in map(parse_stage, definition['stages'])]
+
+
+def validate_definition(definition):
+    """
+    Validate a tournament definition in memory, without any database queries, and return its stages (see
+    `build_stages`). Raises a `ValidationError` (or a `KeyError` for missing keys) if the definition is invalid.
+
+    This checks the same as validating the loaded tournament and its stages (see `Tournament.clean` and `Mode.clean`),
+    but the `played_by` and `podium` references are checked against the declared stage identifiers.
+    """
+    if len(definition['podium']) == 0:
+        raise ValidationError('No podium definition given.')
+
+    stages = build_stages(definition)
+    identifiers = [stage.identifier for stage in stages]
+    for identifier in identifiers:
+        if identifiers.count(identifier) > 1:
+            raise ValidationError(f'Duplicate stage identifier: "{identifier}".')
+
+    try:
+        for identifier, _ in parse_participants_str_list(definition['podium']):
+            if identifier not in identifiers:
+                raise ValueError(f'stage "{identifier}" does not exist')
+    except Exception as error:
+        raise ValidationError(f'Error parsing "podium" definition ({error}).') from error
+
+    for stage in stages:
+
+        # Collect the errors of the fields and the references, like `full_clean` does.
+        errors = dict()
+        try:
+            stage.clean_fields(exclude = ['tournament'])
+        except ValidationError as error:
+            errors = error.update_error_dict(errors)
+        try:
+            for identifier, _ in parse_participants_str_list(stage.played_by):
+                if identifier not in identifiers:
+                    raise ValueError(f'stage "{identifier}" does not exist')
+        except Exception as error:
+            errors = ValidationError(f'Error parsing "played_by" definition of "{stage.identifier}" stage ({error}).').update_error_dict(errors)
+        if len(errors) > 0:
+            raise ValidationError(errors)
+
+    return stages
+
+
+class CompiledDefinition:
+    """
+    A tournament definition, which is parsed once (see `compile_definition`), and from which the stages can be built
+    repeatedly. The definition is validated on demand, only once (see `validate`).
+    """
+
+    def __init__(self, definition):
+        self.definition = copy.deepcopy(definition)
+        self.podium_spec = self.definition['podium']
+        self.stage_specs = [parse_stage(stage) for stage in self.definition['stages']] ## list of (mode class, field values) pairs
+        self.is_valid = False
+
+    def validate(self):
+        """
+        Validate the definition (see `validate_definition`), unless it was already validated successfully.
+        """
+        if not self.is_valid:
+            validate_definition(self.definition)
+            self.is_valid = True
+
+    def build_stages(self):
+        """
+        Build the stages (unsaved, and not associated with any tournament yet, see `build_stages`).
+        """
+        return [mode_class(**copy.deepcopy(fields)) for mode_class, fields in self.stage_specs]
+
+
+@functools.lru_cache(maxsize = 256)
+def compile_definition(definition_str):
+    """
+    Parse a tournament definition given in YAML, and return the `CompiledDefinition`. Raises a `ValidationError` (or a
+    `KeyError` for missing keys) if the definition cannot be parsed.
+
+    The compiled definitions are cached by their content (the least recently used are evicted), so validating, loading,
+    cloning, or testing a tournament repeatedly neither parses nor validates the definition again.
+    """
+    try:
+        definition = yaml.safe_load(definition_str)
+    except yaml.YAMLError as error:
+        raise ValidationError('Definition must be supplied in valid YAML.') from error
+    if not isinstance(definition, dict):
+        raise ValidationError('Definition must be supplied in valid YAML.')
+    return CompiledDefinition(definition)
+
+
+def simulate_tournament(stages, podium_spec, participants_count):
+    """
+    Play a dry run of a tournament with the given number of participants in memory, without any database queries.
+
+    The `stages` are played in order (they can be saved or unsaved, see `build_stages`), where each fixture is won by the
+    participant with the higher ID (the participants are numbered by their slots, starting from 1). Returns the podium,
+    or raises a `ValidationError` if the tournament cannot be played (e.g., due to insufficient participants).
+    """
+    participants = [Participant(id = pidx + 1, name = f'--testuser-{pidx}') for pidx in range(participants_count)]
+    placements = dict() ## the placements of the stages played so far
+
+    def get_placements(identifier):
+        if identifier not in placements:
+            raise ValueError(f'stage "{identifier}" does not exist or is not finished')
+        return placements[identifier]
+
+    for stage_idx, stage in enumerate(stages):
+        try:
+            stage_participants = resolve_participants_str_list(stage.played_by, get_placements) if len(stage.played_by) > 0 else participants
+            placements[stage.identifier] = stage.simulate(stage_participants)
+        except Exception as error:
+            if stage_idx == 0:
+                raise ValidationError(f'Error while initializing tournament ({error}).') from error
+            else:
+                raise ValidationError(f'Error while validating "{stage.identifier}" stage ({error}).') from error
+
+    try:
+        return resolve_participants_str_list(podium_spec, get_placements)
+    except Exception as error:
+        raise ValidationError(f'Error while validating podium ({error}).') from error
+
+
+class StageState:
+    """
+    Snapshot of the state of a stage.
+
+    All fixtures of the stage are loaded along with their confirmation counts by a single query, so that the levels, the
+    current level, and whether the stage is finished, are determined in memory. The number of required confirmations can
+    be passed if it is already known (it is the same for all stages of a tournament). Alternatively, the annotated
+    `fixtures` of the stage can be passed if they were already loaded (e.g., along with the fixtures of other stages). The
+    snapshot is not updated when fixtures change, a new snapshot must be loaded instead.
+    """
+
+    def __init__(self, stage, required_confirmations_count = None, fixtures = None):
+        if fixtures is None:
+            if required_confirmations_count is None:
+                required_confirmations_count = stage.tournament.required_confirmations_count
+            fixtures = stage.fixtures.annotate_confirmations(required_confirmations_count).order_by('level', 'id')
+
+        self.stage = stage
+        self.fixtures = sorted(fixtures, key = lambda fixture: (fixture.level, fixture.id))
+        self.fixtures_by_level = dict()
+        for fixture in self.fixtures:
+            self.fixtures_by_level.setdefault(fixture.level, list()).append(fixture)
+        self.confirmed_fixture_ids = frozenset(fixture.id for fixture in self.fixtures if fixture.is_confirmed)
+
+        # The current level is the first level with unconfirmed fixtures.
+        self.levels = 1 + max(self.fixtures_by_level.keys(), default = -1)
+        self.current_level = self.levels
+        for level in range(self.levels):
+            if not all((self.is_confirmed(fixture) for fixture in self.get_fixtures(level))):
+                self.current_level = level
+                break
+
+    @property
+    def is_finished(self):
+        if self.levels == 0:
+            return False
+        else:
+            return self.current_level == self.levels
+
+    @property
+    def current_fixtures(self):
+        if self.is_finished:
+            return None
+        else:
+            return self.get_fixtures(self.current_level)
+
+    def get_fixtures(self, level):
+        return self.fixtures_by_level.get(level, list())
+
+    def get_level_name(self, level):
+        return self.stage.get_level_name(level, state = self)
+
+    def is_confirmed(self, fixture):
+        return fixture.id in self.confirmed_fixture_ids
+
+
 class Mode(PolymorphicModel):
 
     identifier = models.SlugField()
@@ -328,6 +760,13 @@ class Mode(PolymorphicModel):
     def create_fixtures(self, participants):
         raise NotImplementedError()
 
+    def simulate(self, participants):
+        """
+        Play the stage in memory, where each fixture is won by the participant with the higher ID, and return the
+        placements (without any database queries, see `simulate_tournament`).
+        """
+        raise NotImplementedError()
+
     @property
     def placements(self):
         raise NotImplementedError()
@@ -344,55 +783,49 @@ class Mode(PolymorphicModel):
     def participants(self):
         if len(self.played_by) == 0:
             return self.tournament.participants
-        participants = list()
-        for identifier, position in parse_participants_str_list(self.played_by):
-
-            try:
-                participants_chunk = unwrap_list(self.tournament.stages.get(identifier = identifier).placements[position])
-            except IndexError as error:
-                raise ValueError(f'insufficient participants: {identifier}[{position}] is out of range') from error
+        return resolve_participants_str_list(self.played_by, lambda identifier: self.tournament.stages.get(identifier = identifier).placements)
 
-            if isinstance(participants_chunk, list):
-                participants += participants_chunk
-            else:
-                participants.append(participants_chunk)
-        return participants
+    def load_state(self, required_confirmations_count = None, fixtures = None):
+        return StageState(self, required_confirmations_count, fixtures)
 
     @property
     def levels(self):
-        if self.fixtures.count() == 0:
-            return 0
-        else:
-            return 1 + self.fixtures.aggregate(Max('level'))['level__max']
+        return 1 + self.fixtures.aggregate(Max('level', default = -1))['level__max']
 
     @property
     def current_level(self):
-        for level in range(self.levels):
-            fixtures = self.fixtures.filter(level = level)
-            if not all((fixture.is_confirmed for fixture in fixtures)):
-                return level
-        return self.levels
+        return self.load_state().current_level
 
-    def get_level_name(self, level):
+    def get_level_name(self, level, state = None):
         return None
 
     @property
     def current_fixtures(self):
-        if self.is_finished:
+        state = self.load_state()
+        if state.is_finished:
             return None
         else:
-            return self.fixtures.filter(level = self.current_level)
+            return self.fixtures.filter(level = state.current_level)
 
     @property
     def is_finished(self):
-        if self.levels == 0:
-            return False
-        else:
-            return self.current_level == self.levels
+        return self.load_state().is_finished
 
     def check_fixture(self, fixture):
         pass
 
+    def account_fixture(self, fixture):
+        """
+        Account the result of a fixture, which has just become confirmed.
+        """
+        pass
+
+    def rebuild_standings(self, required_confirmations_count = None):
+        """
+        Rebuild the persisted results of the stage from the confirmed fixtures.
+        """
+        pass
+
     def update_fixtures(self):
         return False
 
@@ -456,52 +889,72 @@ def create_division_schedule(participants, with_returns = False):
             return schedule
 
 
-def get_stats(participant, filters = None):
-    if filters is None:
-        filters = dict()
-
-    row = dict(participant = participant, win_count = 0, loss_count = 0, draw_count = 0, matches = 0, balance = 0)
-    for fixture in participant.fixtures1.filter(**filters) | participant.fixtures2.filter(**filters):
-
-        # Only account for confirmed scores.
-        if not fixture.is_confirmed:
-            continue
-        scores = (fixture.score1, fixture.score2)
-        row['matches'] += 1
-
-        # Normalize order of scores so that the score of `participant` is first.
-        if fixture.player2.id == participant.id:
-            scores = scores[::-1]
-
-        # Account points.
-        if scores[0] == scores[1]:
-            row['draw_count'] += 1
-        elif scores[0] > scores[1]:
-            row['win_count'] += 1
-        elif scores[0] < scores[1]:
-            row['loss_count'] += 1
-
-        # Account score balance.
-        row['balance'] += scores[0] - scores[1]
+def compute_standings(groups, fixtures):
+    """
+    Compute the standings of groups of participants in a single pass over the fixtures.
 
-    return row
+    The `groups` are lists of participant IDs, and the `fixtures` are `(player1_id, player2_id, score1, score2)` tuples, which
+    should only comprise confirmed fixtures. Returns a list of rows for each group, sorted by points, balance, matches, and
+    participant ID (in descending order), where the participant of each row is identified by its ID.
+    """
+    participant_ids = np.array(sum(groups, list()), dtype = int)
+    fixtures = np.array(fixtures, dtype = int).reshape(-1, 4)
+
+    # Map the participant IDs of the fixtures to the positions within `participant_ids`.
+    order = np.argsort(participant_ids)
+    pidx1 = order[np.searchsorted(participant_ids, fixtures[:, 0], sorter = order)]
+    pidx2 = order[np.searchsorted(participant_ids, fixtures[:, 1], sorter = order)]
+    score1, score2 = fixtures[:, 2], fixtures[:, 3]
+
+    # Account the wins, losses, draws, matches, and the score balance for each participant.
+    def accumulate(values1, values2):
+        n = len(participant_ids)
+        return np.bincount(pidx1, weights = values1, minlength = n).astype(int) + np.bincount(pidx2, weights = values2, minlength = n).astype(int)
+
+    win_count  = accumulate(score1 > score2, score2 > score1)
+    loss_count = accumulate(score1 < score2, score2 < score1)
+    draw_count = accumulate(score1 == score2, score1 == score2)
+    balance    = accumulate(score1 - score2, score2 - score1)
+    matches    = win_count + loss_count + draw_count
+    points     = 3 * win_count + 1 * draw_count
+
+    # Sort the rows of each group.
+    standings = list()
+    start = 0
+    for group in groups:
+        group_slice = slice(start, start + len(group))
+        ranking = start + np.lexsort([key[group_slice] for key in (participant_ids, matches, balance, points)])[::-1]
+        start += len(group)
+        standings.append([
+            dict(
+                participant = int(participant_ids[pidx]),
+                win_count = int(win_count[pidx]),
+                loss_count = int(loss_count[pidx]),
+                draw_count = int(draw_count[pidx]),
+                matches = int(matches[pidx]),
+                balance = int(balance[pidx]),
+                points = int(points[pidx]),
+            )
+            for pidx in ranking
+        ])
+    return standings
 
 
 class Groups(Mode):
 
-    min_group_size = models.PositiveSmallIntegerField()
-    max_group_size = models.PositiveSmallIntegerField()
+    min_group_size = models.PositiveSmallIntegerField(validators = [MinValueValidator(1), MaxValueValidator(32767)])
+    max_group_size = models.PositiveSmallIntegerField(validators = [MinValueValidator(1), MaxValueValidator(32767)])
     with_returns   = models.BooleanField(default = False)
     groups_info    = models.JSONField(null = True, blank = True)
 
-    def create_fixtures(self, participants):
+    def schedule_fixtures(self, participants):
+        """
+        Split the participants into groups, and schedule the fixtures of the groups in memory. Returns the groups and the
+        (unsaved) fixtures.
+        """
         assert len(participants) >= 2
-
-        # Create groups.
         groups = split_into_groups(participants, self.min_group_size, self.max_group_size)
-        self.groups_info = [[participant.id for participant in group] for group in groups]
-        self.save()
-
+        fixtures = list()
         max_group_size = max((len(group) for group in groups))
         for level, pairings in enumerate(create_division_schedule(np.arange(max_group_size), with_returns = self.with_returns)):
 
@@ -512,27 +965,101 @@ class Groups(Mode):
                     if pidx1 >= len(group) or pidx2 >= len(group): 
                         continue
 
-                    Fixture.objects.create(
-                        mode     = self,
-                        level    = level,
-                        player1  = group[pidx1],
-                        player2  = group[pidx2],
+                    fixtures.append(
+                        Fixture(
+                            mode     = self,
+                            level    = level,
+                            player1  = group[pidx1],
+                            player2  = group[pidx2],
+                        )
                     )
 
-    def get_standings(self, participant):
-        row = get_stats(participant, dict(mode = self))
-        row['points'] = 3 * row['win_count'] + 1 * row['draw_count']
-        return row
+        return groups, fixtures
+
+    @transaction.atomic
+    def create_fixtures(self, participants):
+        groups, fixtures = self.schedule_fixtures(participants)
+        self.groups_info = [[participant.id for participant in group] for group in groups]
+        self.save()
+
+        # The fixtures were scheduled in memory, write them all at once.
+        Fixture.objects.bulk_create(fixtures)
+        self.rebuild_standings()
+
+    def simulate(self, participants):
+        groups, fixtures = self.schedule_fixtures(participants)
+        participants_by_id = {participant.id: participant for participant in participants}
+        standings = compute_standings(
+            [[participant.id for participant in group] for group in groups],
+            [(fixture.player1.id, fixture.player2.id, fixture.player1.id, fixture.player2.id) for fixture in fixtures],
+        )
+        return Groups.get_placements([[participants_by_id[row['participant']] for row in group_standings] for group_standings in standings])
+
+    def get_confirmed_fixtures(self, required_confirmations_count = None):
+        if required_confirmations_count is None:
+            required_confirmations_count = self.tournament.required_confirmations_count
+        return self.fixtures.annotate_confirmations(required_confirmations_count).filter(
+            score1__isnull = False,
+            score2__isnull = False,
+            confirmations_count__gte = required_confirmations_count,
+        )
+
+    @transaction.atomic
+    def rebuild_standings(self, required_confirmations_count = None):
+        """
+        Rebuild the standings table from the confirmed fixtures.
+        """
+        self.standings_rows.all().delete()
+        if self.groups_info is None:
+            return
+        fixtures = self.get_confirmed_fixtures(required_confirmations_count).values_list('player1_id', 'player2_id', 'score1', 'score2')
+        StandingsRow.objects.bulk_create([
+            StandingsRow(mode = self, group = group_idx, participant_id = row.pop('participant'), **row)
+            for group_idx, group_standings in enumerate(compute_standings(self.groups_info, list(fixtures)))
+            for row in group_standings
+        ])
+
+    def account_fixture(self, fixture):
+        """
+        Account the result of a fixture, which has just become confirmed, in the standings table.
+        """
+        for player_id, (score, opponent_score) in ((fixture.player1_id, fixture.score), (fixture.player2_id, fixture.score[::-1])):
+            self.standings_rows.filter(participant_id = player_id).update(
+                win_count  = F('win_count')  + int(score > opponent_score),
+                loss_count = F('loss_count') + int(score < opponent_score),
+                draw_count = F('draw_count') + int(score == opponent_score),
+                matches    = F('matches') + 1,
+                balance    = F('balance') + score - opponent_score,
+                points     = F('points') + (3 if score > opponent_score else 1 if score == opponent_score else 0),
+            )
+
+    def get_standings_rows(self):
+        """
+        Return the rows of the standings table, sorted by group, points, balance, matches, and participant ID.
+
+        The standings table is kept consistent by the write paths: It is updated incrementally when fixtures become
+        confirmed (see `account_fixture`), and rebuilt when the tournament is advanced from scratch (see
+        `Tournament.update_state`). It is only read here, and can be repaired by `rebuild_standings`.
+        """
+        return list(self.standings_rows.select_related('participant').order_by('group', '-points', '-balance', '-matches', '-participant_id'))
 
     @property
     def standings(self):
         if self.groups_info is None:
             return None
-        standings = list()
-        for group in self.groups_info:
-            group_standings = [self.get_standings(participant) for participant in self.tournament.participants.filter(id__in = group)]
-            group_standings.sort(key = lambda row: (row['points'], row['balance'], row['matches'], row['participant'].id), reverse = True)
-            standings.append(group_standings)
+        standings = [list() for _ in self.groups_info]
+        for row in self.get_standings_rows():
+            standings[row.group].append(
+                dict(
+                    participant = row.participant,
+                    win_count = row.win_count,
+                    loss_count = row.loss_count,
+                    draw_count = row.draw_count,
+                    matches = row.matches,
+                    balance = row.balance,
+                    points = row.points,
+                )
+            )
         return standings
 
     @property
@@ -540,8 +1067,37 @@ class Groups(Mode):
         standings = self.standings
         if standings is None:
             return None
-        max_group_size = max((len(group) for group in self.groups_info))
-        return [[group[position]['participant'] for group in standings if position < len(group)] for position in range(max_group_size)]
+        return Groups.get_placements([[row['participant'] for row in group_standings] for group_standings in standings])
+
+    @staticmethod
+    def get_placements(rankings):
+        """
+        Return the placements from the ranked participants of each group (the participants of the same position across all
+        groups are placed equally).
+        """
+        max_group_size = max((len(ranking) for ranking in rankings))
+        return [[ranking[position] for ranking in rankings if position < len(ranking)] for position in range(max_group_size)]
+
+
+class StandingsRow(models.Model):
+
+    mode        = models.ForeignKey('Mode', on_delete = models.CASCADE, related_name = 'standings_rows')
+    participant = models.ForeignKey('Participant', on_delete = models.CASCADE, related_name = 'standings_rows')
+    group       = models.PositiveSmallIntegerField()
+    win_count   = models.PositiveIntegerField(default = 0)
+    loss_count  = models.PositiveIntegerField(default = 0)
+    draw_count  = models.PositiveIntegerField(default = 0)
+    matches     = models.PositiveIntegerField(default = 0)
+    balance     = models.IntegerField(default = 0)
+    points      = models.PositiveIntegerField(default = 0)
+
+    class Meta:
+        unique_together = [
+            ('mode', 'participant'),
+        ]
+
+    def __str__(self):
+        return f'{self.participant} in {self.mode}'
 
 
 def is_power_of_two(val, ret_floor = False):
@@ -612,9 +1168,9 @@ class Knockout(Mode):
         else:
             return 1
 
-    def create_fixtures(self, participants):
+    def schedule_fixtures(self, participants):
         """
-        Creates the fixtures of the knockout tree.
+        Lays out the fixtures of the knockout tree in memory.
 
         In single elimination mode, there is only the main tree, which is a binary tree.
         We count the levels of the binary tree from bottom to up (starting with level 0).
@@ -625,6 +1181,9 @@ class Knockout(Mode):
 
         In double elimination mode, an additional tree is added, which partially overlaps with the main tree and is not binary.
         Also, an additional root node is added, which connects the roots of the two trees (identified by position 0).
+
+        Returns the (unsaved) fixtures in order of creation, and the edges of the propagation graph. The edges are tuples
+        of the source fixture, the slot (winner or loser), the destination fixture, and the player slot.
         """
         assert len(participants) >= 2
         levels = math.ceil(math.log2(len(participants)))
@@ -632,21 +1191,28 @@ class Knockout(Mode):
         # Re-order the participants so that the first (highest ranked) are matched against the last (lowest ranked), also accounting for playoffs.
         participants = Knockout.reorder_participants(participants, account_for_playoffs = True)
 
+        # Keep track of the fixtures in order of creation, and of the edges of the propagation graph.
+        fixtures = list()
+        propagation_edges = list()
+
         # In double elimination mode, add the additional root node.
         last_fixture_position = len(participants) - 1
         first_complete_level  = Knockout.get_first_complete_level(last_fixture_position)
-        if self.double_elimination and len(participants) >= 4:
-            double_elimination_root_fixture = Fixture.objects.create(
+        double_elimination    = self.double_elimination and len(participants) >= 4
+        if double_elimination:
+            double_elimination_root_fixture = Fixture(
                 mode    = self,
                 level   = first_complete_level + 1 + (levels - 1 - first_complete_level) * 2,
                 player1 = None,
                 player2 = None,
                 extras  = dict(position = 0),
             )
+            fixtures.append(double_elimination_root_fixture)
 
         # Build the main tree (embedding the corresponding propagation graph).
         remaining_participants = list(participants)
         tree1_levels, first_tree1_level = list(), -1
+        tree1_fixtures = dict() ## maps the positions to the fixtures of the main tree
         for fixture_position in range(1, last_fixture_position + 1):
             level = levels - int(math.log2(fixture_position)) - 1
 
@@ -658,30 +1224,31 @@ class Knockout(Mode):
             player1 = None if fixture_position * 2 <= last_fixture_position else remaining_participants.pop()
             player2 = None if fixture_position * 2 <  last_fixture_position else remaining_participants.pop()
 
-            extras = dict(tree = 1, position = fixture_position)
-            parent_fixture = self.get_main_parent_fixture(fixture_position)
-            if parent_fixture is not None:
-                extras['propagate'] = dict(
-                    winner = dict(
-                        fixture_id  = parent_fixture.id,
-                        player_slot = 2 if parent_fixture.extras['position'] == 0 else 1 + fixture_position % 2,
-                    ),
-                )
-
-            fixture = Fixture.objects.create(
+            fixture = Fixture(
                 mode    = self,
                 level   = level,
                 player1 = player1,
                 player2 = player2,
-                extras  = extras,
+                extras  = dict(tree = 1, position = fixture_position),
             )
+            fixtures.append(fixture)
+            tree1_fixtures[fixture_position] = fixture
             tree1_levels[0].append(fixture)
 
+            # The parent fixture is directly obtained due to the binary tree structure (except for the extra root node).
+            if fixture_position == 1:
+                parent_fixture = double_elimination_root_fixture if double_elimination else None
+            else:
+                parent_fixture = tree1_fixtures[fixture_position // 2]
+            if parent_fixture is not None:
+                player_slot = 2 if parent_fixture.extras['position'] == 0 else 1 + fixture_position % 2
+                propagation_edges.append((fixture, 'winner', parent_fixture, player_slot))
+
         # Assert that all participants were distributed.
         assert len(remaining_participants) == 0, remaining_participants
 
         # In double elimination mode, add the second tree.
-        if self.double_elimination and len(participants) >= 4:
+        if double_elimination:
 
             # For each complete level, except the first, add two levels of the second tree.
             complete_tree1_levels = tree1_levels[first_complete_level:]
@@ -693,46 +1260,26 @@ class Knockout(Mode):
                 for fidx, tree1_fixture in enumerate(tree1_level):
 
                     # Create the first fixture (second tree vs. main tree).
-                    tree2_fixture1_extras = dict(
-                        tree = 2,
-                        propagate = dict(
-                            winner = dict(
-                                fixture_id  = previous_tree2_level[fidx // 2].id,
-                                player_slot = 1 + fidx % 2,
-                            ),
-                        ),
-                    )
-
-                    tree2_fixture1 = Fixture.objects.create(
+                    tree2_fixture1 = Fixture(
                         mode   = self,
                         level  = first_complete_level + (tree1_fixture.level - first_complete_level) * 2,
-                        extras = tree2_fixture1_extras,
+                        extras = dict(tree = 2),
                     )
+                    fixtures.append(tree2_fixture1)
+                    propagation_edges.append((tree2_fixture1, 'winner', previous_tree2_level[fidx // 2], 1 + fidx % 2))
 
                     # Add propagation from the main to the second tree (and update the level).
                     tree1_fixture.level = first_complete_level - 1 + (tree1_fixture.level - first_complete_level) * 2
-                    tree1_fixture.extras['propagate']['loser'] = dict(
-                        fixture_id  = tree2_fixture1.id,
-                        player_slot = 2,
-                    )
-                    tree1_fixture.save()
+                    propagation_edges.append((tree1_fixture, 'loser', tree2_fixture1, 2))
 
                     # Create the second fixture (second tree vs. second tree, main tree vs. main tree if it is the first level of the second tree).
-                    tree2_fixture2_extras = dict(
-                        tree = 2,
-                        propagate = dict(
-                            winner = dict(
-                                fixture_id  = tree2_fixture1.id,
-                                player_slot = 1,
-                            ),
-                        ),
-                    )
-
-                    tree2_fixture2 = Fixture.objects.create(
+                    tree2_fixture2 = Fixture(
                         mode   = self,
                         level  = tree1_fixture.level,
-                        extras = tree2_fixture2_extras,
+                        extras = dict(tree = 2),
                     )
+                    fixtures.append(tree2_fixture2)
+                    propagation_edges.append((tree2_fixture2, 'winner', tree2_fixture1, 1))
                     tree2_level.append(tree2_fixture2)
 
                 # Update the reference to the top-most level of the second tree.
@@ -740,105 +1287,145 @@ class Knockout(Mode):
 
             # Add propagation from the main to the top-most level of the second tree.
             for fidx, tree1_fixture in enumerate(complete_tree1_levels[0]):
-                tree1_fixture.extras['propagate']['loser'] = dict(
-                    fixture_id  = previous_tree2_level[fidx // 2].id,
-                    player_slot = 1 + fidx % 2,
-                )
-                tree1_fixture.save()
-
-    def get_main_parent_fixture(self, fixture_position):
-        """
-        Return the parent fixture in the main knockout tree.
-        """
-
-        # In double elimination mode, there can be an extra root node.
-        if fixture_position == 1:
-            try:
-                return self.fixtures.get(extras = dict(position = 0))
-            except Fixture.DoesNotExist:
-                return None
+                propagation_edges.append((tree1_fixture, 'loser', previous_tree2_level[fidx // 2], 1 + fidx % 2))
 
-        # Other parent nodes are directly obtained due to the binary tree structure.
-        else:
-            return self.fixtures.get(extras__tree = 1, extras__position = fixture_position // 2)
+        return fixtures, propagation_edges
 
-    @staticmethod
-    def _propagate(src_fixture, src_slot, dst_fixture, dst_player_slot):
+    @transaction.atomic
+    def create_fixtures(self, participants):
         """
-        Propagate the value of the `src_slot` attribute of `src_fixture` to the corresponding `player` attribute of `dst_fixture`.
+        Creates the fixtures of the knockout tree (see `schedule_fixtures`).
 
-        The corresponding `player` attribute is identified by `dst_play_slot`, which must be 1 or 2.
+        The trees are laid out in memory first, along with the propagation graph, and then written in two phases: The
+        fixtures are created by a bulk insert, and then the IDs of the fixtures are filled into the propagation graph by a
+        bulk update.
         """
-        player = getattr(src_fixture, src_slot, None)
-        assert player is not None
-        dst_attr = 'player' + str(dst_player_slot)
-        if getattr(dst_fixture, dst_attr) is not None:
-            return False
-        else:
-            setattr(dst_fixture, dst_attr, player)
-            dst_fixture.save()
-            return True
-        
-
-    def propagate(self, fixture):
-        assert fixture.mode.id == self.id
+        fixtures, propagation_edges = self.schedule_fixtures(participants)
+
+        # Write the fixtures, then fill the IDs of the fixtures into the propagation graph.
+        Fixture.objects.bulk_create(fixtures)
+        for src_fixture, src_slot, dst_fixture, dst_player_slot in propagation_edges:
+            src_fixture.extras.setdefault('propagate', dict())[src_slot] = dict(
+                fixture_id  = dst_fixture.id,
+                player_slot = dst_player_slot,
+            )
+        Fixture.objects.bulk_update([fixture for fixture in fixtures if 'propagate' in fixture.extras], ['extras'])
 
-        # Keep track of whether anything was propagated.
-        propagated = False
+    def account_fixture(self, fixture):
+        """
+        Propagate the winner and loser of a fixture, which has just become confirmed.
+        """
+        self.propagate(fixture)
 
-        # Propagate along the propagation graph.
-        propagate = fixture.extras.get('propagate', dict())
-        for slot_name in propagate.keys():
-            dst_fixture = self.fixtures.get(id = propagate[slot_name]['fixture_id'])
-            _propagated = Knockout._propagate(fixture, slot_name, dst_fixture, propagate[slot_name]['player_slot'])
-            propagated  = propagated or _propagated
+    def propagate(self, *fixtures):
+        """
+        Propagate the winners and losers of the (confirmed) `fixtures` along the propagation graph.
 
-        # Return whether any updates were performed.
-        return propagated
+        The destination fixtures are loaded at once, and only propagations which have not been performed yet (i.e. the
+        destination player slot is still empty) are performed. The updated fixtures are written by a single bulk update.
+        Returns whether any updates were performed.
+        """
+        edges = list()
+        for fixture in fixtures:
+            assert fixture.mode_id == self.id
+            for slot_name, edge in fixture.extras.get('propagate', dict()).items():
+                edges.append((fixture, slot_name, edge['fixture_id'], 'player' + str(edge['player_slot'])))
+        dst_fixtures = self.fixtures.in_bulk([dst_fixture_id for _, _, dst_fixture_id, _ in edges])
+
+        # Propagate along the edges of the propagation graph.
+        updated_fixtures = dict()
+        for src_fixture, slot_name, dst_fixture_id, dst_attr in edges:
+            dst_fixture = dst_fixtures[dst_fixture_id]
+            if getattr(dst_fixture, dst_attr + '_id') is None:
+                player_id = getattr(src_fixture, slot_name + '_id')
+                assert player_id is not None
+                setattr(dst_fixture, dst_attr + '_id', player_id)
+                updated_fixtures[dst_fixture.id] = dst_fixture
+
+        # Write the updated fixtures, and return whether any updates were performed.
+        Fixture.objects.bulk_update(updated_fixtures.values(), ['player1', 'player2'])
+        return len(updated_fixtures) > 0
 
     def update_fixtures(self):
-        updates_performed = False
-        for fixture in self.fixtures.all():
-            if fixture.is_confirmed:
-                if self.propagate(fixture):
-                    updates_performed = True
-        return updates_performed
+        """
+        Propagate the winners and losers of the confirmed fixtures, which have not been accounted yet.
+
+        Only the confirmed fixtures of the stage which have a destination in the propagation graph are loaded, and they
+        are propagated at once (see `propagate`).
+        """
+        required_confirmations_count = self.tournament.required_confirmations_count
+        fixtures = self.fixtures.filter(extras__has_key = 'propagate').annotate_confirmations(required_confirmations_count).filter(
+            score1__isnull = False,
+            score2__isnull = False,
+            confirmations_count__gte = required_confirmations_count,
+        )
+        return self.propagate(*fixtures)
 
     def check_fixture(self, fixture):
         if fixture.score1 is not None and fixture.score2 is not None and fixture.score1 == fixture.score2:
             raise ValidationError('Draws are not allowed in knockout mode.')
 
+    def simulate(self, participants):
+        fixtures, propagation_edges = self.schedule_fixtures(participants)
+        propagation_graph = dict() ## maps the source fixtures (by identity) to the edges of the propagation graph
+        for src_fixture, src_slot, dst_fixture, dst_player_slot in propagation_edges:
+            propagation_graph.setdefault(id(src_fixture), list()).append((src_slot, dst_fixture, dst_player_slot))
+
+        # Play the levels in order, and propagate the winners and losers (always to higher levels).
+        for fixture in sorted(fixtures, key = lambda fixture: fixture.level):
+            if fixture.player1 is None or fixture.player2 is None:
+                raise ValueError(f'fixture at level {fixture.level} has no opponents')
+            fixture.score = (fixture.player1.id, fixture.player2.id)
+            for src_slot, dst_fixture, dst_player_slot in propagation_graph.get(id(fixture), list()):
+                dst_attr = 'player' + str(dst_player_slot)
+                if getattr(dst_fixture, dst_attr) is None:
+                    setattr(dst_fixture, dst_attr, getattr(fixture, src_slot))
+
+        return self.get_placements(fixtures)
+
     @property
     def placements(self):
-        if self.fixtures.count() == 0:
+        return self.get_placements(list(self.fixtures.select_related('player1', 'player2').order_by('id')))
+
+    def get_placements(self, fixtures):
+        """
+        Return the placements from the `fixtures` of the stage (in order of creation), or `None` if there are none.
+        """
+        if len(fixtures) == 0:
             return None
-        final_match = self.fixtures.get(level = self.levels - 1)
+        levels = 1 + max((fixture.level for fixture in fixtures))
+        final_match, = [fixture for fixture in fixtures if fixture.level == levels - 1]
         if not self.double_elimination:
-            return [final_match.winner] + [fixture.loser for fixture in self.fixtures.order_by('-level')]
+            return [final_match.winner] + [fixture.loser for fixture in sorted(fixtures, key = lambda fixture: -fixture.level)]
         else:
             chunk1 = [final_match.winner, final_match.loser]
-            chunk2 = [fixture.loser for fixture in self.fixtures.filter(extras__tree = 1) if fixture.loser not in chunk1]
+            chunk2 = [fixture.loser for fixture in fixtures if fixture.extras.get('tree') == 1 and fixture.loser not in chunk1]
             return chunk1 + chunk2
 
-    def get_level_size(self, level):
+    def get_level_size(self, level, levels = None):
         """
         Return the maximum possible number of participants in a level of the main tree.
 
-        This is not the actual number of participants, but the maximum number based on the tree structure.
+        This is not the actual number of participants, but the maximum number based on the tree structure. The number of
+        `levels` of the stage can be passed if it is already known.
         """
-        rlevel = self.levels - level
+        if levels is None:
+            levels = self.levels
+        rlevel = levels - level
         assert rlevel >= 1, f'level={level}, self.levels={self.levels}'
         if not self.double_elimination:
             return pow(2, rlevel)
         else:
             return pow(2, rlevel // 2)
 
-    def get_level_name(self, level):
-        first_complete_level = Knockout.get_first_complete_level(self.fixtures.filter(extras__tree = 1).count())
+    def get_level_name(self, level, state = None):
+        if state is None:
+            state = self.load_state()
+        first_complete_level = Knockout.get_first_complete_level(sum((1 for fixture in state.fixtures if fixture.extras.get('tree') == 1)))
         if level < first_complete_level:
             return 'Playoffs'
 
-        level_size = self.get_level_size(level)
+        level_size = self.get_level_size(level, state.levels)
         if level_size == 2:
             base_level_name = 'Final'
         elif level_size == 4:
@@ -855,7 +1442,7 @@ class Knockout(Mode):
             if level == first_complete_level:
                 return base_level_name
             if level_size <= 2:
-                rlevel = self.levels - level
+                rlevel = state.levels - level
                 prefix = {3: '1st', 2: '2nd', 1: '3rd'}[rlevel]
                 return f'{prefix} Final Round'
             else:
@@ -863,6 +1450,22 @@ class Knockout(Mode):
                 return f'{prefix} {base_level_name}'
 
 
+class FixtureQuerySet(QuerySet):
+
+    def annotate_confirmations(self, required_confirmations_count):
+        """
+        Annotate the fixtures with their number of confirmations, and the number of required confirmations.
+
+        The number of required confirmations is the same for all fixtures of a tournament, so it is passed (see
+        `Tournament.required_confirmations_count`) instead of being queried for each fixture. Annotated fixtures
+        determine `is_confirmed` without issuing any further queries.
+        """
+        return self.annotate(
+            confirmations_count = Count('confirmations'),
+            required_confirmations = Value(required_confirmations_count),
+        )
+
+
 class Fixture(models.Model):
 
     mode    = models.ForeignKey('Mode', on_delete = models.CASCADE, related_name = 'fixtures')
@@ -874,6 +1477,8 @@ class Fixture(models.Model):
     score2  = models.PositiveSmallIntegerField(null = True)
     confirmations = models.ManyToManyField('auth.User', related_name = 'fixture_confirmations')
 
+    objects = FixtureQuerySet.as_manager()
+
     class Meta:
         constraints = [
             CheckConstraint(
@@ -922,13 +1527,16 @@ class Fixture(models.Model):
 
     @property
     def required_confirmations_count(self):
-        return 1 + self.mode.tournament.participations.filter(participant__user__isnull = False).count() // 2
+        if hasattr(self, 'required_confirmations'):
+            return self.required_confirmations
+        return self.mode.tournament.required_confirmations_count
 
     @property
     def is_confirmed(self):
         if self.score1 is None or self.score2 is None:
             return False
-        return self.confirmations.count() >= self.required_confirmations_count
+        confirmations_count = self.confirmations_count if hasattr(self, 'confirmations_count') else self.confirmations.count()
+        return confirmations_count >= self.required_confirmations_count
 
     @property
     def winner(self):
@@ -949,3 +1557,15 @@ class Fixture(models.Model):
         if self.score1 > self.score2:
             return self.player2
         return None
+
+    @property
+    def winner_id(self):
+        if self.score1 is None or self.score2 is None or self.score1 == self.score2:
+            return None
+        return self.player1_id if self.score1 > self.score2 else self.player2_id
+
+    @property
+    def loser_id(self):
+        if self.score1 is None or self.score2 is None or self.score1 == self.score2:
+            return None
+        return self.player2_id if self.score1 > self.score2 else self.player1_id
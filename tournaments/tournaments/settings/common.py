@@ -24,16 +24,17 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    'frontend', ## precedes `staticfiles` so that its `collectstatic` command takes precedence
     'django.contrib.staticfiles',
     'polymorphic',
     'crispy_forms',
     'crispy_bootstrap4',
     'capture_tag',
     'tournaments',
-    'frontend',
 ]
 
 MIDDLEWARE = [
+    'frontend.profiling.SQLProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,6 +76,30 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'TIMEOUT': None, ## entries are keyed by revision, so they never become stale, and the least recently used are evicted
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
+
+# SQL profiling (see `frontend.profiling`)
+
+SQL_PROFILING_SAMPLE_RATE = 0 ## fraction of the requests to be profiled (0 disables the profiling)
+SQL_PROFILING_HISTORY_SIZE = 100 ## number of the recent profiles kept by each worker process
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -1,10 +1,16 @@
 import numpy as np
+import yaml
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Q
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django_test_migrations.contrib.unittest_case import MigratorTestCase
 
 from tournaments.models import (
+    AllStarsRow,
+    CompiledDefinition,
     Fixture,
     Groups,
     Knockout,
@@ -12,12 +18,16 @@ from tournaments.models import (
     Participant,
     Participation,
     Tournament,
+    build_stages,
+    compile_definition,
+    compute_standings,
     create_division_schedule,
-    get_stats,
     is_power_of_two,
     parse_placements_str,
+    simulate_tournament,
     split_into_groups,
     unwrap_list,
+    validate_definition,
 )
 
 test_tournament1_yml = \
@@ -128,6 +138,38 @@ class create_division_schedule_Test(TestCase):
         assert_division_schedule_validity(self, actual, with_returns = False)
 
 
+class compute_standings_Test(TestCase):
+
+    def test_empty(self):
+        actual = compute_standings([[1, 2], [3]], [])
+        self.assertEqual([[row['participant'] for row in group] for group in actual], [[2, 1], [3]])
+        for row in sum(actual, list()):
+            self.assertEqual(row['matches'], 0)
+            self.assertEqual(row['points'], 0)
+
+    def test(self):
+        groups = [[1, 2, 3], [4, 5]]
+        fixtures = [
+            (1, 2, 3, 1),
+            (2, 3, 2, 2),
+            (3, 1, 4, 0),
+            (5, 4, 1, 0),
+        ]
+        actual = compute_standings(groups, fixtures)
+        expected = [
+            [
+                dict(participant = 3, win_count = 1, loss_count = 0, draw_count = 1, matches = 2, balance =  4, points = 4),
+                dict(participant = 1, win_count = 1, loss_count = 1, draw_count = 0, matches = 2, balance = -2, points = 3),
+                dict(participant = 2, win_count = 0, loss_count = 1, draw_count = 1, matches = 2, balance = -2, points = 1),
+            ],
+            [
+                dict(participant = 5, win_count = 1, loss_count = 0, draw_count = 0, matches = 1, balance =  1, points = 3),
+                dict(participant = 4, win_count = 0, loss_count = 1, draw_count = 0, matches = 1, balance = -1, points = 0),
+            ],
+        ]
+        self.assertEqual(actual, expected)
+
+
 class parse_placements_str_Test(TestCase):
 
     def setUp(self):
@@ -221,10 +263,7 @@ def _add_participating_users(participating_users_pool, tournament):
         participant = Participant.get_or_create_for_user(user)
         participants.append(participant)
 
-        Participation.objects.create(
-            participant = participant,
-            tournament = tournament,
-            slot_id = Participation.next_slot_id(tournament))
+        Participation.create_in_next_slot(tournament, participant)
 
     return participants
 
@@ -236,10 +275,7 @@ def _add_participants_by_names(names, tournament):
         participant = Participant.objects.get_or_create(name = name)[0]
         participants.append(participant)
 
-        Participation.objects.create(
-            tournament = tournament,
-            participant = participant,
-            slot_id = Participation.next_slot_id(tournament))
+        Participation.create_in_next_slot(tournament, participant)
 
     return participants
 
@@ -257,6 +293,19 @@ def _confirm_fixture(participating_users, fixture, score1 = 0, score2 = 0):
     fixture.save()
 
 
+def _get_knockout_stats(participant, stage):
+    """
+    Count the wins, losses, and matches of a participant in a knockout stage, from the confirmed fixtures (the standings
+    of group stages are read from their `StandingsRow` objects instead).
+    """
+    row = dict(win_count = 0, loss_count = 0, matches = 0)
+    for fixture in stage.fixtures.filter(Q(player1 = participant) | Q(player2 = participant)):
+        if fixture.is_confirmed:
+            row['matches'] += 1
+            row['win_count' if fixture.winner_id == participant.id else 'loss_count'] += 1
+    return row
+
+
 class ModeTestBase:
 
     def setUp(self):
@@ -339,6 +388,7 @@ class ModeTest(ModeTestBase, TestCase):
                 self.confirm_fixture(fixture, 0, 1)
             else:
                 self.confirm_fixture(fixture, 0, 0)
+        mode1.rebuild_standings() ## the fixtures were confirmed without being accounted
 
         # Verify participants of the next stage.
         actual_participants = [p.id for p in mode2.participants]
@@ -419,6 +469,19 @@ class GroupsTest(ModeTestBase, TestCase):
         mode = self.test_create_fixtures_extended()
         self.assertEqual(mode.levels, 3)
 
+    def test_create_fixtures_num_queries(self):
+        participants = self.add_participants(self.tournament, 8)
+        num_queries = list()
+        for participants_count in (4, 8):
+            mode = Groups.objects.create(tournament = self.tournament, min_group_size = 2, max_group_size = 32, with_returns = True)
+            with CaptureQueriesContext(connection) as queries:
+                mode.create_fixtures(participants[:participants_count])
+            num_queries.append(len(queries))
+
+        # Verify that the number of queries does not depend on the number of fixtures.
+        self.assertEqual(mode.fixtures.count(), 8 * 7)
+        self.assertEqual(num_queries[0], num_queries[1])
+
     def test_current_fixtures(self):
         mode = self.test_create_fixtures_extended()
 
@@ -460,6 +523,40 @@ class GroupsTest(ModeTestBase, TestCase):
         self.assertEqual(mode.current_level, 3)
         self.assertIsNone(mode.current_fixtures)
 
+    def test_load_state(self):
+        mode = self.test_create_fixtures_extended()
+
+        # Test on level 0 (the state is loaded by two queries, one for the fixtures and one for the required confirmations).
+        with self.assertNumQueries(2):
+            state = mode.load_state()
+        self.assertEqual(state.levels, 3)
+        self.assertEqual(state.current_level, 0)
+        self.assertFalse(state.is_finished)
+        self.assertEqual([fixture.id for fixture in state.current_fixtures], [fixture.id for fixture in mode.current_fixtures])
+
+        # Test on level 1 (the previously loaded state is not updated).
+        self.confirm_fixture(state.current_fixtures[0])
+        self.assertEqual(state.current_level, 0)
+        state = mode.load_state()
+        self.assertEqual(state.current_level, 1)
+        self.assertTrue(state.is_confirmed(state.get_fixtures(0)[0]))
+        self.assertFalse(state.is_confirmed(state.get_fixtures(1)[0]))
+
+        # Test on level 3.
+        for fixture in mode.fixtures.filter(level__gte = 1):
+            self.confirm_fixture(fixture)
+        state = mode.load_state()
+        self.assertEqual(state.current_level, 3)
+        self.assertTrue(state.is_finished)
+        self.assertIsNone(state.current_fixtures)
+
+    def test_load_state_empty(self):
+        mode = Groups.objects.create(tournament = self.tournament, min_group_size = 2, max_group_size = 3)
+        with self.assertNumQueries(1):
+            state = mode.load_state(required_confirmations_count = 1)
+        self.assertEqual(state.levels, 0)
+        self.assertFalse(state.is_finished)
+
     def test_standings(self):
         mode = self.test_create_fixtures_extended()
 
@@ -520,6 +617,7 @@ class GroupsTest(ModeTestBase, TestCase):
         # Test on level 1 (user-5 vs. user-3).
         fixture = mode.current_fixtures.get()
         self.confirm_fixture(fixture, score1 = 8, score2 = 7)
+        mode.account_fixture(fixture)
         expected_standings = [
             [
                 {
@@ -576,6 +674,7 @@ class GroupsTest(ModeTestBase, TestCase):
         # Test on level 2 (user-1 vs. user-5).
         fixture = mode.current_fixtures.get()
         self.confirm_fixture(fixture, score1 = 5, score2 = 5)
+        mode.account_fixture(fixture)
         expected_standings = [
             [
                 {
@@ -632,6 +731,7 @@ class GroupsTest(ModeTestBase, TestCase):
         # Test on level 3 (user-3 vs. user-1).
         fixture1, fixture2 = mode.current_fixtures.all()
         self.confirm_fixture(fixture1, score1 = 6, score2 = 9)
+        mode.account_fixture(fixture1)
         expected_standings = [
             [
                 {
@@ -687,6 +787,7 @@ class GroupsTest(ModeTestBase, TestCase):
 
         # Test on level 3 (user-4 vs. user-2).
         self.confirm_fixture(fixture2, score1 = 5, score2 = 5)
+        mode.account_fixture(fixture2)
         expected_standings = [
             [
                 {
@@ -763,6 +864,54 @@ class GroupsTest(ModeTestBase, TestCase):
         mode = Groups.objects.create(tournament = self.tournament, min_group_size = 2, max_group_size = 2)
         self.assertIsNone(mode.placements)
 
+    def test_standings_num_queries(self):
+        mode = Groups.objects.create(tournament = self.tournament, min_group_size = 2, max_group_size = 16)
+        participants = self.add_participants(self.tournament, 16)
+        mode.create_fixtures(participants)
+        for fixture in mode.fixtures.all():
+            self.confirm_fixture(fixture, 1, 0)
+        mode.rebuild_standings()
+
+        # The number of queries does not depend on the number of participants or fixtures.
+        with self.assertNumQueries(1):
+            standings = mode.standings
+        self.assertEqual([row['matches'] for row in standings[0]], [15] * 16)
+        self.assertEqual(sum(row['win_count'] for row in standings[0]), mode.fixtures.count())
+
+    def test_account_fixture(self):
+        mode = self.test_create_fixtures_extended()
+        self.assertEqual(mode.standings_rows.count(), 5)
+
+        # Confirm the fixture of level 0 (user-5 vs. user-3), and account it in the standings table.
+        fixture = mode.current_fixtures.get()
+        self.confirm_fixture(fixture, score1 = 8, score2 = 7)
+        mode.account_fixture(fixture)
+        self.assertEqual(mode.standings_rows.get(participant__user__id = 5).points, 3)
+        self.assertEqual(mode.standings_rows.get(participant__user__id = 3).balance, -1)
+
+        # Verify that the standings table is read without being rebuilt.
+        with self.assertNumQueries(1):
+            standings = mode.standings
+        self.assertEqual([row['participant'].user.id for row in standings[0]], [5, 1, 3])
+
+    def test_rebuild_standings(self):
+        mode = self.test_create_fixtures_extended()
+
+        # Confirm the fixture of level 0 (user-5 vs. user-3) without accounting it, so that the standings table is out of sync.
+        fixture = mode.current_fixtures.get()
+        self.confirm_fixture(fixture, score1 = 7, score2 = 8)
+        self.assertEqual(mode.standings_rows.get(participant__user__id = 3).points, 0)
+
+        # Verify that reading the standings does not rebuild the table.
+        standings = mode.standings
+        self.assertEqual([row['participant'].user.id for row in standings[0]], [5, 3, 1])
+
+        # Verify that the standings table is rebuilt explicitly.
+        mode.rebuild_standings()
+        standings = mode.standings
+        self.assertEqual([row['participant'].user.id for row in standings[0]], [3, 1, 5])
+        self.assertEqual(mode.standings_rows.get(participant__user__id = 3).points, 3)
+
     def test_required_confirmations_count(self):
         # Define expected counts (keys are tuples of number of participating users, and number of virtual participants).
         expected_counts = {
@@ -992,10 +1141,11 @@ class KnockoutTest(ModeTestBase, TestCase):
         mode = self.test_create_fixtures_5participants()
         playoff = mode.current_fixtures.get()
 
-        # Propagate play-off (user-5 vs. user-4).
+        # Propagate play-off (user-5 vs. user-4), by loading and updating the destination fixture at once.
         playoff.score = (10, 12)
         playoff.save()
-        propagate_ret = mode.propagate(playoff)
+        with self.assertNumQueries(2):
+            propagate_ret = mode.propagate(playoff)
         self.assertTrue(propagate_ret)
 
         # Verify fixtures after play-off.
@@ -1054,6 +1204,36 @@ class KnockoutTest(ModeTestBase, TestCase):
 
         return mode
 
+    def test_update_fixtures(self):
+        mode = self.test_create_fixtures_double_elimination_8participants()
+
+        # Confirm the quarter finals (let the user with the higher ID win).
+        for fixture in mode.fixtures.filter(level = 0):
+            self.confirm_fixture(fixture, fixture.player1.id, fixture.player2.id)
+
+        # Verify that the propagation is performed by a fixed number of queries.
+        with self.assertNumQueries(4):
+            self.assertTrue(mode.update_fixtures())
+        self.assertFalse(mode.update_fixtures())
+
+        # Verify fixtures after quarter finals.
+        actual_fixtures1 = self.group_fixtures_by_level(mode, extras__tree__ne = 2)
+        actual_fixtures2 = self.group_fixtures_by_level(mode, extras__tree = 2)
+        expected_fixtures1 = {
+            0: [(5, 4), (6, 3), (7, 2), (8, 1)],
+            1: [(5, 6), (7, 8)],
+            3: [(None, None)],
+            5: [(None, None)],
+        }
+        expected_fixtures2 = {
+            1: [(4, 3), (2, 1)],
+            2: [(None, None), (None, None)],
+            3: [(None, None)],
+            4: [(None, None)],
+        }
+        self.assertEqual(actual_fixtures1, expected_fixtures1)
+        self.assertEqual(actual_fixtures2, expected_fixtures2)
+
     def test_levels(self):
         mode = self.test_create_fixtures_5participants()
         self.assertEqual(mode.levels, 3)
@@ -1311,6 +1491,19 @@ class KnockoutTest(ModeTestBase, TestCase):
         self.assertEqual(actual_fixtures1, expected_fixtures1)
         self.assertEqual(actual_fixtures2, expected_fixtures2)
 
+    def test_create_fixtures_num_queries(self):
+        participants = self.add_participants(self.tournament, 16)
+        num_queries = list()
+        for participants_count in (5, 16):
+            mode = Knockout.objects.create(tournament = self.tournament, double_elimination = True)
+            with CaptureQueriesContext(connection) as queries:
+                mode.create_fixtures(participants[:participants_count])
+            num_queries.append(len(queries))
+
+        # Verify that the number of queries does not depend on the number of fixtures.
+        self.assertEqual(mode.fixtures.count(), 30)
+        self.assertEqual(num_queries[0], num_queries[1])
+
     def test_get_level_size(self):
         mode = Knockout.objects.create(tournament = self.tournament)
         participants = self.add_participants(self.tournament, 16)
@@ -1589,6 +1782,24 @@ class FixtureTest(TestCase):
         self.fixture.score = (10, 10)
         self.assertIsNone(self.fixture.loser)
 
+    def test_annotate_confirmations(self):
+        self.fixture.score = (10, 12)
+        self.fixture.save()
+        self.fixture.confirmations.add(self.players[0])
+
+        # Verify that annotated fixtures are evaluated without further queries.
+        with self.assertNumQueries(1):
+            fixture = Fixture.objects.annotate_confirmations(2).get(id = self.fixture.id)
+            self.assertEqual(fixture.confirmations_count, 1)
+            self.assertEqual(fixture.required_confirmations_count, 2)
+            self.assertFalse(fixture.is_confirmed)
+
+        # Verify the result against the non-annotated fixture.
+        self.fixture.confirmations.add(self.players[1])
+        fixture = Fixture.objects.annotate_confirmations(2).get(id = self.fixture.id)
+        self.assertTrue(fixture.is_confirmed)
+        self.assertEqual(fixture.is_confirmed, self.fixture.is_confirmed)
+
 
 class TournamentTest(TestCase):
 
@@ -1644,6 +1855,33 @@ class TournamentTest(TestCase):
     def test_shuffle_participants_twice(self):
         self.test_shuffle_participants(repeat = 1)
 
+    def test_shuffle_participants_seed(self):
+        permutations = list()
+        for _ in range(2):
+            tournament = self.test_load_tournament1()
+            _add_participating_users(self.participating_users, tournament)
+            with self.assertNumQueries(5):
+                tournament.shuffle_participants(seed = 0)
+            permutations.append([p.id for p in tournament.participants])
+            self.assertEqual(list(tournament.participations.values_list('slot_id', flat = True)), list(range(16)))
+        self.assertEqual(permutations[0], permutations[1])
+
+    def test_update_participants(self):
+        tournament = self.test_load_tournament1()
+        _add_participants_by_names(['Participant1', 'Participant2'], tournament)
+        User.objects.create(username = 'user-17')
+
+        tournament.update_participants(['user-1', 'Participant2', 'Participant3', 'user-17', 'user-1'])
+        self.assertEqual([participant.name for participant in tournament.participants], ['user-1', 'Participant2', 'Participant3', 'user-17'])
+        self.assertEqual(Participant.objects.get(name = 'user-17').user.username, 'user-17')
+        self.assertFalse(Participant.objects.filter(name = 'Participant1').exists())
+
+        # The number of queries does not depend on the number of participants.
+        participant_names = [f'Participant{pidx}' for pidx in range(100)]
+        with self.assertNumQueries(11):
+            tournament.update_participants(participant_names)
+        self.assertEqual([participant.name for participant in tournament.participants], participant_names)
+
     def test_current_stage(self):
         tournament = self.test_load_tournament1()
         self.assertEqual(tournament.current_stage.id, tournament.stages.all()[0].id)
@@ -1705,36 +1943,170 @@ class TournamentTest(TestCase):
         self.assertTrue(placement(p4) < 2, placement(p4))
 
         # Verify that `p1` won all `main_round` matches
-        p1_stats_main_round = get_stats(p1, dict(mode = main_round))
+        p1_stats_main_round = _get_knockout_stats(p1, main_round)
         self.assertEqual(p1_stats_main_round['win_count'], p1_stats_main_round['matches'])
 
         # Verify that `p2` won all `main_round` matches except for one lost match
-        p2_stats_main_round = get_stats(p2, dict(mode = main_round))
+        p2_stats_main_round = _get_knockout_stats(p2, main_round)
         self.assertEqual(p2_stats_main_round['win_count'], p2_stats_main_round['matches'] - 1)
         self.assertEqual(p2_stats_main_round['loss_count'], 1)
 
         # Verify that `p3` won all `main_round` matches except for one, had one less than `p2`, and won the playoffs
-        p3_stats_main_round = get_stats(p3, dict(mode = main_round))
+        p3_stats_main_round = _get_knockout_stats(p3, main_round)
         self.assertEqual(p3_stats_main_round['win_count'], p3_stats_main_round['matches'] - 1)
         self.assertEqual(p3_stats_main_round['loss_count'], 1)
         self.assertEqual(p3_stats_main_round['matches'], p2_stats_main_round['matches'] - 1)
 
-        p3_stats_playoffs = get_stats(p3, dict(mode = playoffs))
+        p3_stats_playoffs = playoffs.standings_rows.values().get(participant = p3)
         self.assertEqual(p3_stats_playoffs['win_count'], 1)
         self.assertEqual(p3_stats_playoffs['matches'], 1)
 
         # Verify that `p4` won all `main_round` matches except for one, had one less than `p2`, and lost the playoffs
-        p4_stats_main_round = get_stats(p3, dict(mode = main_round))
+        p4_stats_main_round = _get_knockout_stats(p3, main_round)
         self.assertEqual(p4_stats_main_round['win_count'], p4_stats_main_round['matches'] - 1)
         self.assertEqual(p4_stats_main_round['loss_count'], 1)
         self.assertEqual(p4_stats_main_round['matches'], p2_stats_main_round['matches'] - 1)
 
-        p4_stats_playoffs = get_stats(p4, dict(mode = playoffs))
+        p4_stats_playoffs = playoffs.standings_rows.values().get(participant = p4)
         self.assertEqual(p4_stats_playoffs['loss_count'], 1)
         self.assertEqual(p4_stats_playoffs['matches'], 1)
 
         return tournament
 
+    def test_handle_confirmed_fixture(self):
+        expected_tournament = self.test_update_state()
+        tournament = self.test_load_tournament1()
+        _add_participating_users(self.participating_users, tournament)
+        tournament.update_state()
+
+        # Play through the tournament, always make the participant with the higher ID win.
+        while tournament.current_stage is not None:
+            stage = tournament.current_stage
+            for fixture in stage.current_fixtures:
+                _confirm_fixture(self.participating_users, fixture, score1 = fixture.player1.id, score2 = fixture.player2.id)
+                tournament.handle_confirmed_fixture(stage, fixture)
+
+        # Verify that the results are the same as when using `update_state`.
+        for expected_stage, stage in zip(expected_tournament.stages.all(), tournament.stages.all()):
+            self.assertEqual(
+                [(fixture.player1.id, fixture.player2.id, fixture.score) for fixture in stage.fixtures.all()],
+                [(fixture.player1.id, fixture.player2.id, fixture.score) for fixture in expected_stage.fixtures.all()],
+            )
+        self.assertEqual([p.id for p in tournament.podium], [p.id for p in expected_tournament.podium])
+
+    def test_state(self):
+        tournament = Tournament.load(test_tournament1_yml, 'Test Cup')
+        self.assertEqual(tournament.state, 'draft')
+
+        # Publish the tournament.
+        tournament.published = True
+        tournament.save()
+        self.assertEqual(tournament.state, 'open')
+
+        # Start the tournament.
+        _add_participating_users(self.participating_users, tournament)
+        tournament.update_state()
+        self.assertEqual(tournament.state, 'active')
+
+        # Play through the tournament.
+        while tournament.current_stage is not None:
+            stage = tournament.current_stage
+            for fixture in stage.current_fixtures:
+                _confirm_fixture(self.participating_users, fixture, score1 = fixture.player1.id, score2 = fixture.player2.id)
+                tournament.handle_confirmed_fixture(stage, fixture)
+            self.assertEqual(Tournament.objects.get(id = tournament.id).state, 'active' if tournament.current_stage else 'finished')
+        self.assertEqual(tournament.state, 'finished')
+
+        # Reset the tournament.
+        tournament.reset()
+        self.assertEqual(Tournament.objects.get(id = tournament.id).state, 'open')
+        self.assertEqual(Fixture.objects.filter(mode__tournament = tournament).count(), 0)
+        self.assertEqual(tournament.podium.count(), 0)
+
+        # Draft the tournament.
+        tournament.published = False
+        tournament.save()
+        self.assertEqual(Tournament.objects.get(id = tournament.id).state, 'draft')
+
+    def test_state_stale(self):
+        tournament = Tournament.load(test_tournament1_yml, 'Test Cup', published = True)
+        stale_tournament = Tournament.objects.get(id = tournament.id)
+
+        # Start the tournament.
+        _add_participating_users(self.participating_users, tournament)
+        tournament.update_state()
+        self.assertEqual(Tournament.objects.get(id = tournament.id).state, 'active')
+        revision = Tournament.objects.get(id = tournament.id).revision
+        self.assertGreater(revision, stale_tournament.revision)
+
+        # Saving a stale instance does not roll back the state.
+        stale_tournament.name = 'Test Cup 2'
+        stale_tournament.save(update_fields = ['name'])
+        self.assertEqual(Tournament.objects.get(id = tournament.id).state, 'active')
+        stale_tournament.save()
+        self.assertEqual(Tournament.objects.get(id = tournament.id).state, 'active')
+        self.assertEqual(Tournament.objects.get(id = tournament.id).name, 'Test Cup 2')
+
+        # Saving a stale instance does not roll back the revision either, but increments it.
+        stale_tournament.save(update_fields = ['name', 'revision'])
+        self.assertEqual(Tournament.objects.get(id = tournament.id).revision, revision + 3)
+        self.assertEqual(stale_tournament.revision, revision + 3)
+
+    def test_state_published_toggled(self):
+        tournament = Tournament.load(test_tournament1_yml, 'Test Cup', published = True)
+        _add_participating_users(self.participating_users, tournament)
+        tournament.update_state()
+
+        # Toggling the `published` flag of a started tournament does not reset the state.
+        tournament = Tournament.objects.get(id = tournament.id)
+        tournament.published = False
+        tournament.save()
+        tournament.published = True
+        tournament.save()
+        self.assertEqual(Tournament.objects.get(id = tournament.id).state, 'active')
+
+    def test_revision(self):
+        tournament = Tournament.load(test_tournament1_yml, 'Test Cup')
+        _add_participating_users(self.participating_users, tournament)
+        self.assertEqual(tournament.revision, 0)
+
+        # Starting the tournament bumps the revision.
+        tournament.update_state()
+        self.assertEqual(tournament.revision, 1)
+
+        # Confirming a fixture bumps the revision.
+        stage = tournament.current_stage
+        fixture = stage.current_fixtures[0]
+        _confirm_fixture(self.participating_users, fixture)
+        tournament.handle_confirmed_fixture(stage, fixture)
+        self.assertEqual(tournament.revision, 2)
+        self.assertEqual(Tournament.objects.get(id = tournament.id).revision, 2)
+
+    def test_allstars(self):
+        tournament = self.test_update_state()
+        podium = list(tournament.podium)
+        self.assertEqual(
+            [(row.participant.id, row.gold, row.silver, row.bronze) for row in AllStarsRow.objects.order_by('-gold', '-silver')],
+            [(podium[0].id, 1, 0, 0), (podium[1].id, 0, 1, 0), (podium[2].id, 0, 0, 1)],
+        )
+        self.assertEqual([row.participant.id for row in AllStarsRow.top(1)], [podium[1].id])
+        self.assertEqual(list(AllStarsRow.top(0, count = 1, offset = 1)), [])
+
+        # Updating the podium again does not count the placements twice.
+        tournament.update_state()
+        self.assertEqual(AllStarsRow.objects.get(participant = podium[0]).gold, 1)
+
+        # Resetting the tournament withdraws the placements.
+        tournament.reset()
+        self.assertEqual(AllStarsRow.objects.count(), 0)
+
+    def test_allstars_ties(self):
+        participants = [Participant.objects.create(name = name) for name in ('Charlie', 'Alice', 'Bob')]
+        AllStarsRow.objects.bulk_create([AllStarsRow(participant = participant, gold = 1) for participant in participants])
+
+        # Ties are broken by the names of the participants.
+        self.assertEqual([row.participant.name for row in AllStarsRow.top(0)], ['Alice', 'Bob', 'Charlie'])
+
     def test_podium(self):
         tournament = self.test_update_state()
         main_round = tournament.stages.get(identifier =    'main_round')
@@ -1790,6 +2162,314 @@ class TournamentTest(TestCase):
         self.assertRaises(ValidationError, tournament.stages.all()[1].full_clean)
 
 
+
+def _play_tournament(definition, participants_count):
+    """
+    Play a tournament in the database, where each fixture is won by the participant with the higher ID, and roll back.
+
+    Returns the podium (as the slots of the participants), or the messages of the `ValidationError` raised in the same
+    cases as by `simulate_tournament`.
+    """
+    with transaction.atomic():
+        tournament = Tournament.load(definition, 'Test')
+        _add_participants_by_names([f'--testuser-{pidx}' for pidx in range(participants_count)], tournament)
+        user = User.objects.create(username = 'test')
+        try:
+            try:
+                tournament.update_state()
+            except Exception as error:
+                raise ValidationError(f'Error while initializing tournament ({error}).') from error
+
+            while tournament.current_stage is not None:
+                try:
+                    for fixture in tournament.current_stage.current_fixtures:
+                        fixture.confirmations.add(user)
+                        fixture.score = (fixture.player1.id, fixture.player2.id)
+                        fixture.save()
+                    tournament.update_state()
+                except Exception as error:
+                    if tournament.current_stage is None:
+                        raise ValidationError(f'Error while validating podium ({error}).') from error
+                    else:
+                        raise ValidationError(f'Error while validating "{tournament.current_stage.identifier}" stage ({error}).') from error
+
+            result = [int(participant.name.split('-')[-1]) for participant in tournament.podium]
+        except ValidationError as error:
+            result = error.messages
+        transaction.set_rollback(True)
+    return result
+
+
+class simulate_tournament_Test(TestCase):
+
+    definitions = [
+        test_tournament1_yml,
+        test_tournament2_yml,
+        """
+        stages:
+        - id: main_round
+          mode: knockout
+        podium:
+        - main_round.placements[0]
+        - main_round.placements[1]
+        - main_round.placements[2:4]
+        """,
+        """
+        stages:
+        - id: main_round
+          mode: division
+        podium:
+        - main_round.placements[:3]
+        """,
+        test_tournament1_yml.replace('id: main_round', 'id: 5').replace('main_round.', '5.'),
+    ]
+
+    # The podiums and errors of the definitions, as determined by playing the tournaments in the database, before the dry
+    # runs were introduced.
+    baseline_results = {
+        (0, 2): ['Error while initializing tournament (insufficient participants).'],
+        (0, 3): ['Error while validating "playoffs" stage (insufficient participants: main_round[2] is out of range).'],
+        (0, 4): ['Error while validating "playoffs" stage (insufficient participants: main_round[2] is out of range).'],
+        (0, 5): ['Error while initializing tournament (insufficient participants).'],
+        (0, 6): [5, 4, 3],
+        (0, 7): [6, 5, 4],
+        (0, 8): [7, 6, 5],
+        (0, 9): [8, 7, 6],
+        (0, 10): [9, 8, 7],
+        (0, 11): [10, 8, 9],
+        (0, 12): [11, 10, 9],
+        (1, 2): ['Error while validating "playoffs" stage (insufficient participants: main_round[2] is out of range).'],
+        (1, 3): ['Error while validating "playoffs" stage (insufficient participants: main_round[3] is out of range).'],
+        (1, 4): [3, 2, 1],
+        (1, 5): [4, 2, 1],
+        (1, 6): [5, 4, 1],
+        (1, 7): [6, 5, 4],
+        (1, 8): [7, 6, 5],
+        (1, 9): [8, 6, 5],
+        (1, 10): [9, 8, 5],
+        (1, 11): [10, 9, 4],
+        (1, 12): [11, 10, 9],
+        (2, 2): ['Error while validating podium (insufficient participants: main_round[2] is out of range).'],
+        (2, 3): ['Error while validating podium (insufficient participants: main_round[3] is out of range).'],
+        (2, 4): [3, 2, 1, 0],
+        (2, 5): [4, 2, 1, 0],
+        (2, 6): [5, 1, 4, 0],
+        (2, 7): [6, 5, 4, 0],
+        (2, 8): [7, 5, 4, 6],
+        (2, 9): [8, 6, 4, 5],
+        (2, 10): [9, 5, 3, 4],
+        (2, 11): [10, 4, 9, 3],
+        (2, 12): [11, 3, 9, 2],
+        (3, 2): ['Error while validating podium (insufficient participants: main_round[2] is out of range).'],
+        (3, 3): [2, 1, 0],
+        (3, 4): [3, 2, 1],
+        (3, 5): [4, 3, 2],
+        (3, 6): [5, 4, 3],
+        (3, 7): [6, 5, 4],
+        (3, 8): [7, 6, 5],
+        (3, 9): [8, 7, 6],
+        (3, 10): [9, 8, 7],
+        (3, 11): [10, 9, 8],
+        (3, 12): [11, 10, 9],
+        (4, 2): ['Error while initializing tournament (insufficient participants).'],
+        (4, 3): ['Error while validating "playoffs" stage (insufficient participants: 5[2] is out of range).'],
+        (4, 4): ['Error while validating "playoffs" stage (insufficient participants: 5[2] is out of range).'],
+        (4, 5): ['Error while initializing tournament (insufficient participants).'],
+        (4, 6): [5, 4, 3],
+        (4, 7): [6, 5, 4],
+        (4, 8): [7, 6, 5],
+        (4, 9): [8, 7, 6],
+        (4, 10): [9, 8, 7],
+        (4, 11): [10, 8, 9],
+        (4, 12): [11, 10, 9],
+    }
+
+    def simulate(self, definition, participants_count):
+        definition = yaml.safe_load(definition)
+        try:
+            with self.assertNumQueries(0):
+                podium = simulate_tournament(build_stages(definition), definition['podium'], participants_count)
+        except ValidationError as error:
+            return error.messages
+        return [participant.id - 1 for participant in podium]
+
+    def test_parity(self):
+        """
+        The dry runs yield the same podiums and errors as tournaments played in the database.
+        """
+        for definition_idx, definition in enumerate(self.definitions):
+            for participants_count in range(2, 13):
+                with self.subTest(definition = definition_idx, participants_count = participants_count):
+                    self.assertEqual(self.simulate(definition, participants_count), _play_tournament(definition, participants_count))
+
+    def test_baseline(self):
+        """
+        The dry runs yield the same podiums and errors as before they were introduced.
+        """
+        for (definition_idx, participants_count), result in self.baseline_results.items():
+            with self.subTest(definition = definition_idx, participants_count = participants_count):
+                self.assertEqual(self.simulate(self.definitions[definition_idx], participants_count), result)
+
+    def test_unknown_stage(self):
+        definition = yaml.safe_load(test_tournament1_yml)
+        definition['podium'][-1] = 'playoff.placements[0]'
+        with self.assertRaisesMessage(ValidationError, 'Error while validating podium (stage "playoff" does not exist or is not finished).'):
+            simulate_tournament(build_stages(definition), definition['podium'], 16)
+
+    def test_tournament_test(self):
+        tournament = Tournament.load(test_tournament1_yml, 'Test Cup')
+        _add_participants_by_names([f'Participant{pidx}' for pidx in range(5)], tournament)
+        with self.assertRaisesMessage(ValidationError, 'Error while initializing tournament (insufficient participants).'):
+            tournament.test()
+
+        _add_participants_by_names(['Participant5'], tournament)
+        with self.assertNumQueries(1):
+            tournament.test()
+        self.assertFalse(Fixture.objects.exists())
+
+        # Verify the test of a tournament loaded without YAML (the stages are loaded from the database).
+        tournament = Tournament.load(yaml.safe_load(test_tournament1_yml), 'Test Cup')
+        _add_participants_by_names([f'Participant{pidx}' for pidx in range(6)], tournament)
+        with self.assertNumQueries(4):
+            tournament.test()
+
+
+class validate_definition_Test(TestCase):
+
+    def validate(self, definition):
+        definition = yaml.safe_load(definition)
+        try:
+            with self.assertNumQueries(0):
+                validate_definition(definition)
+        except ValidationError as error:
+            return error.messages
+        return None
+
+    def validate_in_db(self, definition):
+        """
+        Validate the definition by loading and cleaning the tournament in the database (the reference).
+        """
+        definition = yaml.safe_load(definition)
+        try:
+            with transaction.atomic():
+                tournament = Tournament.load(definition = definition, name = 'Test')
+                tournament.full_clean()
+                for stage in tournament.stages.all():
+                    stage.full_clean()
+                transaction.set_rollback(True)
+        except ValidationError as error:
+            return error.messages
+        return None
+
+    def test_valid(self):
+        for definition in (test_tournament1_yml, test_tournament2_yml):
+            self.assertIsNone(self.validate(definition))
+            self.assertIsNone(self.validate_in_db(definition))
+
+    def test_parity(self):
+        """
+        The validation yields the same errors as validating the tournament in the database.
+        """
+        definitions = [
+            test_tournament1_yml.replace('id: preliminaries', 'id: pre liminaries'),
+            test_tournament1_yml.replace('mode: knockout', 'mode: swiss'),
+            test_tournament1_yml.replace('name: Preliminaries', f'name: {"Preliminaries" * 10}'),
+            test_tournament1_yml.replace('- preliminaries.placements[0]', '- qualifiers.placements[0]'),
+            test_tournament1_yml.replace('- preliminaries.placements[0]', '- preliminaries.placements[x]'),
+            test_tournament1_yml.replace('- main_round.placements[0]', '- finals.placements[0]'),
+            test_tournament1_yml.replace('- main_round.placements[0]', '- main_round.placements[1]'),
+        ]
+        for definition_idx, definition in enumerate(definitions):
+            with self.subTest(definition = definition_idx):
+                errors = self.validate(definition)
+                self.assertIsNotNone(errors)
+                self.assertEqual(errors, self.validate_in_db(definition))
+
+    def test_invalid_integer(self):
+        definition = test_tournament1_yml.replace('max-group-size: 4', 'max-group-size: four')
+        self.assertEqual(self.validate(definition), ['“four” value must be an integer.'])
+
+    def test_invalid_group_size(self):
+        for min_group_size in (-1, 0):
+            with self.subTest(min_group_size = min_group_size):
+                definition = test_tournament1_yml.replace('min-group-size: 3', f'min-group-size: {min_group_size}')
+                self.assertEqual(self.validate(definition), ['Ensure this value is greater than or equal to 1.'])
+        definition = test_tournament1_yml.replace('max-group-size: 4', 'max-group-size: 32768')
+        self.assertEqual(self.validate(definition), ['Ensure this value is less than or equal to 32767.'])
+
+    def test_numeric_identifier(self):
+        definition = test_tournament1_yml.replace('id: main_round', 'id: 5').replace('main_round.', '5.')
+        self.assertIsNone(self.validate(definition))
+        self.assertIsNone(self.validate_in_db(definition))
+
+    def test_duplicate_identifier(self):
+        definition = test_tournament1_yml.replace('id: playoffs', 'id: preliminaries')
+        self.assertEqual(self.validate(definition), ['Duplicate stage identifier: "preliminaries".'])
+
+    def test_missing_key(self):
+        definition = yaml.safe_load(test_tournament1_yml)
+        del definition['stages'][0]['mode']
+        with self.assertRaises(KeyError):
+            validate_definition(definition)
+
+    def test_no_podium(self):
+        definition = yaml.safe_load(test_tournament1_yml)
+        definition['podium'] = []
+        with self.assertRaisesMessage(ValidationError, 'No podium definition given.'):
+            validate_definition(definition)
+
+    def test_stages(self):
+        stages = validate_definition(yaml.safe_load(test_tournament1_yml))
+        self.assertEqual([stage.identifier for stage in stages], ['preliminaries', 'main_round', 'playoffs'])
+        self.assertTrue(all(stage.id is None for stage in stages))
+
+
+class compile_definition_Test(TestCase):
+
+    def setUp(self):
+        compile_definition.cache_clear()
+
+    def test_cache(self):
+        compiled_definition = compile_definition(test_tournament1_yml)
+        self.assertIsInstance(compiled_definition, CompiledDefinition)
+        self.assertIs(compile_definition(test_tournament1_yml), compiled_definition)
+        self.assertIs(compile_definition(str(test_tournament1_yml + ' ')[:-1]), compiled_definition) ## equal content
+        self.assertIsNot(compile_definition(test_tournament2_yml), compiled_definition)
+        self.assertEqual(compile_definition.cache_info().hits, 2)
+
+    def test_validate(self):
+        compiled_definition = compile_definition(test_tournament1_yml.replace('- main_round.placements[0]', '- finals.placements[0]'))
+        for _ in range(2):
+            with self.assertRaisesMessage(ValidationError, 'Error parsing "podium" definition (stage "finals" does not exist).'):
+                compiled_definition.validate()
+        self.assertFalse(compiled_definition.is_valid)
+
+        compiled_definition = compile_definition(test_tournament1_yml)
+        compiled_definition.validate()
+        self.assertTrue(compiled_definition.is_valid)
+
+    def test_invalid_yaml(self):
+        for definition in ('1 + 1', 'stages: [', ''):
+            with self.subTest(definition = definition):
+                with self.assertRaisesMessage(ValidationError, 'Definition must be supplied in valid YAML.'):
+                    compile_definition(definition)
+
+    def test_build_stages(self):
+        """
+        The stages are built anew each time, so that loading a tournament does not alter the compiled definition.
+        """
+        compiled_definition = compile_definition(test_tournament1_yml)
+        tournament1 = Tournament.load(test_tournament1_yml, 'Test Cup 1')
+        tournament1.podium_spec.append('main_round.placements[2]')
+        tournament2 = Tournament.load(test_tournament1_yml, 'Test Cup 2')
+        self.assertEqual(len(compiled_definition.podium_spec), 3)
+        self.assertEqual(len(tournament2.podium_spec), 3)
+        self.assertEqual(
+            [stage.identifier for stage in tournament1.stages.all()],
+            [stage.identifier for stage in tournament2.stages.all()])
+        self.assertTrue(all(stage.id is None for stage in compiled_definition.build_stages()))
+
+
 class MigrationTest_0002_to_0003(MigratorTestCase):
 
     migrate_from = ('tournaments', '0002_remove_fixture_position_fixture_extras')
@@ -1821,3 +2501,80 @@ class MigrationTest_0002_to_0003(MigratorTestCase):
             participation = NewParticipation.objects.get(id = participation_id)
             self.assertEqual(participation.participant.name, username)
             self.assertEqual(participation.participant.user.username, username)
+
+
+class MigrationTest_0003_to_0004(MigratorTestCase):
+
+    migrate_from = ('tournaments', '0003_participant_alter_participation_unique_together_and_more')
+    migrate_to   = ('tournaments', '0004_standingsrow')
+
+    def prepare(self):
+        OldTournament    = self.old_state.apps.get_model('tournaments', 'Tournament')
+        OldParticipant   = self.old_state.apps.get_model('tournaments', 'Participant')
+        OldParticipation = self.old_state.apps.get_model('tournaments', 'Participation')
+        OldGroups        = self.old_state.apps.get_model('tournaments', 'Groups')
+        OldFixture       = self.old_state.apps.get_model('tournaments', 'Fixture')
+        OldUser          = self.old_state.apps.get_model('auth', 'User')
+
+        tournament = OldTournament.objects.create(name = 'Test Cup', podium_spec = list())
+        users = [OldUser.objects.create(username = f'user-{uidx}', password = 'password') for uidx in range(3)]
+        participants = [OldParticipant.objects.create(name = user.username, user = user) for user in users]
+        for slot_id, participant in enumerate(participants):
+            OldParticipation.objects.create(tournament = tournament, participant = participant, slot_id = slot_id)
+        self.participant_ids = [participant.id for participant in participants]
+
+        # A group stage, where the 1st fixture is confirmed and the 2nd is not (2 confirmations are required).
+        stage = OldGroups.objects.create(tournament = tournament, identifier = 'groups', min_group_size = 3, max_group_size = 3, groups_info = [self.participant_ids])
+        fixture1 = OldFixture.objects.create(mode = stage, level = 0, player1 = participants[0], player2 = participants[1], score1 = 2, score2 = 1)
+        fixture1.confirmations.add(*users[:2])
+        fixture2 = OldFixture.objects.create(mode = stage, level = 1, player1 = participants[2], player2 = participants[0], score1 = 3, score2 = 0)
+        fixture2.confirmations.add(users[0])
+
+        # A group stage without groups yet.
+        OldGroups.objects.create(tournament = tournament, identifier = 'groups2', min_group_size = 3, max_group_size = 3)
+        self.stage_id = stage.id
+
+    def test_migration(self):
+        NewStandingsRow = self.new_state.apps.get_model('tournaments', 'StandingsRow')
+
+        rows = NewStandingsRow.objects.order_by('group', '-points', '-balance', '-matches', '-participant_id')
+        self.assertEqual(
+            [(row.mode_id, row.participant_id, row.points, row.balance, row.matches) for row in rows],
+            [
+                (self.stage_id, self.participant_ids[0], 3,  1, 1),
+                (self.stage_id, self.participant_ids[2], 0,  0, 0),
+                (self.stage_id, self.participant_ids[1], 0, -1, 1),
+            ],
+        )
+
+
+class MigrationTest_0004_to_0005(MigratorTestCase):
+
+    migrate_from = ('tournaments', '0004_standingsrow')
+    migrate_to   = ('tournaments', '0005_tournament_state')
+
+    def prepare(self):
+        OldTournament    = self.old_state.apps.get_model('tournaments', 'Tournament')
+        OldParticipant   = self.old_state.apps.get_model('tournaments', 'Participant')
+        OldParticipation = self.old_state.apps.get_model('tournaments', 'Participation')
+        OldMode          = self.old_state.apps.get_model('tournaments', 'Mode')
+        OldFixture       = self.old_state.apps.get_model('tournaments', 'Fixture')
+
+        participant = OldParticipant.objects.create(name = 'Participant')
+        self.tournament_ids = dict()
+        for state in ('draft', 'open', 'active', 'finished'):
+            tournament = OldTournament.objects.create(name = state, podium_spec = list(), published = state != 'draft')
+            participation = OldParticipation.objects.create(tournament = tournament, participant = participant, slot_id = 0)
+            if state in ('active', 'finished'):
+                stage = OldMode.objects.create(tournament = tournament, identifier = 'stage')
+                OldFixture.objects.create(mode = stage, level = 0, player1 = participant)
+            if state == 'finished':
+                participation.podium_position = 0
+                participation.save()
+            self.tournament_ids[state] = tournament.id
+
+    def test_migration(self):
+        NewTournament = self.new_state.apps.get_model('tournaments', 'Tournament')
+
+        for state, tournament_id in self.tournament_ids.items():
+            self.assertEqual(NewTournament.objects.get(id = tournament_id).state, state)